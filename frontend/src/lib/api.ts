@@ -62,6 +62,30 @@ export async function getQuestionsByCollection(collectionId: number) {
   return res.json();
 }
 
+export async function patchQuestions(
+  collectionId: number,
+  batch: {
+    create?: { question: string; options: string[]; correct_answer: string }[];
+    update?: ({ id: number } & Partial<{
+      question: string;
+      options: string[];
+      correct_answer: string;
+    }>)[];
+    delete?: number[];
+  }
+) {
+  const res = await fetch(
+    `${API_BASE}/quiz-collections/${collectionId}/questions`,
+    {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(batch),
+    }
+  );
+  if (!res.ok) throw new Error('Failed to update questions');
+  return res.json();
+}
+
 // --- Quiz Endpoints (Legacy) ---
 
 export async function getQuizzes(categoryId: number) {
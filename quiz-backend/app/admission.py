@@ -0,0 +1,279 @@
+from collections import deque
+from .database import _env_bool
+from .fastjson import dumps
+from .snapshot import _Route
+from typing import Deque, Dict, List, NamedTuple, Optional, Pattern, Tuple
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+
+# Admission control for the HTTP routes.
+#
+# At most ADMISSION_CONCURRENCY requests are served at once. Writes (anything
+# but GET/HEAD) are further capped by ADMISSION_WRITE_LIMIT, so a burst of
+# writes queued behind SQLite's single writer lock cannot take every
+# threadpool thread, and routes listed in ADMISSION_ROUTES get their own
+# limits inside that. Requests over a limit wait in a bounded FIFO queue;
+# when a slot frees up, queued reads are admitted before queued writes.
+# A request that finds its queue full, or waits longer than
+# ADMISSION_QUEUE_TIMEOUT, is answered at once: 429 when its route's own
+# queue is full, 503 otherwise, both with a Retry-After estimated from the
+# queue length and recent service times.
+
+ENABLED = _env_bool("ADMISSION_CONTROL", False)
+CONCURRENCY = int(os.environ.get("ADMISSION_CONCURRENCY", 40))
+READ_QUEUE = int(os.environ.get("ADMISSION_READ_QUEUE", 256))
+WRITE_LIMIT = int(os.environ.get("ADMISSION_WRITE_LIMIT", 8))
+WRITE_QUEUE = int(os.environ.get("ADMISSION_WRITE_QUEUE", 128))
+QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 5))
+# "METHOD /path=limit/queue", comma-separated; {name} matches one path segment
+ROUTES = os.environ.get("ADMISSION_ROUTES", "POST /results=4/256,POST /quiz-collections=2/32")
+# Never queued: scrapes, stats and long-lived streams
+EXEMPT_PREFIXES = ("/metrics", "/events", "/admission", "/docs", "/openapi.json")
+
+READ_METHODS = ("GET", "HEAD")
+MAX_RETRY_AFTER = 60
+# Weight of the newest sample in a pool's average service time
+SERVICE_TIME_ALPHA = 0.2
+
+class Pool:
+    def __init__(self, name: str, limit: int, max_queue: int, route: Optional[str] = None):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.route = route  # path template, for route pools
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.service_time = 0.0
+
+    def retry_after(self) -> int:
+        # Time for the queue ahead to drain at the pool's recent pace
+        estimate = max(self.service_time, 0.1) * (self.waiting + 1) / self.limit
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(estimate)))
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "service_time": round(self.service_time, 6),
+        }
+
+class Rejection(NamedTuple):
+    status: int
+    retry_after: int
+    detail: str
+    pool: Pool
+
+class _Waiter:
+    __slots__ = ("pools", "loop", "future", "granted")
+
+    def __init__(self, pools: Tuple[Pool, ...], loop: asyncio.AbstractEventLoop):
+        self.pools = pools
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+def _compile(template: str) -> Pattern:
+    return re.compile("^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(template)) + "$")
+
+def parse_routes(spec: str) -> List[Tuple[str, Pattern, Pool]]:
+    routes = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            route, limits = item.rsplit("=", 1)
+            method, path = route.split()
+            limit, max_queue = (int(n) for n in limits.split("/"))
+        except ValueError:
+            raise ValueError(f"invalid ADMISSION_ROUTES entry {item!r}; expected 'METHOD /path=limit/queue'")
+        routes.append((method.upper(), _compile(path), Pool(f"{method.upper()} {path}", limit, max_queue, path)))
+    return routes
+
+class AdmissionController:
+    def __init__(
+        self,
+        concurrency: int,
+        read_queue: int,
+        write_limit: int,
+        write_queue: int,
+        routes: List[Tuple[str, Pattern, Pool]],
+        queue_timeout: float,
+    ):
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.read = Pool("read", concurrency, read_queue)
+        self.write = Pool("write", min(write_limit, concurrency), write_queue)
+        self._routes = routes
+        # Reads first: _dispatch grants from these in order
+        self._queues: Dict[str, Deque[_Waiter]] = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def pools(self) -> List[Pool]:
+        return [self.read, self.write] + [pool for _, _, pool in self._routes]
+
+    def classify(self, method: str, path: str) -> Tuple[Pool, ...]:
+        """The pools a request counts against, its read/write pool last."""
+        base = self.read if method in READ_METHODS else self.write
+        for route_method, pattern, pool in self._routes:
+            if route_method == method and pattern.match(path):
+                return (pool, base)
+        return (base,)
+
+    def _fits(self, pools: Tuple[Pool, ...]) -> bool:
+        return self.active < self.concurrency and all(pool.active < pool.limit for pool in pools)
+
+    def _start(self, pools: Tuple[Pool, ...]) -> None:
+        self.active += 1
+        for pool in pools:
+            pool.active += 1
+            pool.admitted += 1
+
+    def _dispatch(self) -> None:
+        # Called under the lock whenever capacity may have freed up. Waiters
+        # held back by their route's limit are skipped, not waited behind.
+        for queue in self._queues.values():
+            for waiter in list(queue):
+                if self.active >= self.concurrency:
+                    return
+                if self._fits(waiter.pools):
+                    queue.remove(waiter)
+                    for pool in waiter.pools:
+                        pool.waiting -= 1
+                    self._start(waiter.pools)
+                    waiter.granted = True
+                    _resolve(waiter)
+
+    async def acquire(self, pools: Tuple[Pool, ...]) -> Optional[Rejection]:
+        """Wait for a slot; returns a Rejection instead if the request is shed."""
+        base = pools[-1]
+        queue = self._queues[base.name]
+        with self._lock:
+            # A write also queues while reads are waiting, so freed slots reach them first
+            ahead = queue or (base is self.write and self._queues["read"])
+            if not ahead and self._fits(pools):
+                self._start(pools)
+                return None
+            for pool in pools:
+                if pool.waiting >= pool.max_queue:
+                    pool.rejected += 1
+                    # A saturated route is that client's problem; a saturated server is not
+                    status = 429 if pool.route is not None else 503
+                    return Rejection(status, pool.retry_after(), "Server is busy, retry later", pool)
+            waiter = _Waiter(pools, asyncio.get_running_loop())
+            queue.append(waiter)
+            for pool in pools:
+                pool.waiting += 1
+                pool.queued += 1
+            self._dispatch()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+            return None
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            with self._lock:
+                if not waiter.granted:
+                    queue.remove(waiter)
+                    for pool in pools:
+                        pool.waiting -= 1
+            if waiter.granted:
+                # Admitted just as the wait ended
+                if isinstance(exc, asyncio.CancelledError):
+                    self.release(pools, 0.0)
+                    raise
+                return None
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            pools[0].timed_out += 1
+            return Rejection(503, pools[0].retry_after(), "Timed out waiting for capacity", pools[0])
+
+    def release(self, pools: Tuple[Pool, ...], elapsed: float) -> None:
+        with self._lock:
+            self.active -= 1
+            for pool in pools:
+                pool.active -= 1
+                if elapsed > 0:
+                    pool.service_time += SERVICE_TIME_ALPHA * (elapsed - pool.service_time)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "active": self.active,
+                "pools": {pool.name: pool.stats() for pool in self.pools()},
+            }
+
+def _resolve(waiter: _Waiter) -> None:
+    # The waiter may be on another event loop (e.g. several test clients)
+    def grant():
+        if not waiter.future.done():
+            waiter.future.set_result(True)
+
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is waiter.loop:
+        grant()
+    elif not waiter.loop.is_closed():
+        waiter.loop.call_soon_threadsafe(grant)
+
+def _make_controller() -> Optional[AdmissionController]:
+    if not ENABLED:
+        return None
+    return AdmissionController(CONCURRENCY, READ_QUEUE, WRITE_LIMIT, WRITE_QUEUE, parse_routes(ROUTES), QUEUE_TIMEOUT)
+
+# None unless ADMISSION_CONTROL is set
+admission_controller = _make_controller()
+
+class AdmissionMiddleware:
+    """Queues or sheds requests per the admission controller's limits."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        controller = admission_controller
+        if (
+            controller is None
+            or scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        pools = controller.classify(scope["method"], scope["path"])
+        rejection = await controller.acquire(pools)
+        if rejection is not None:
+            if pools[0].route is not None:
+                # Label the shed request with its route in the request metrics
+                scope["route"] = _Route(pools[0].route)
+            body = dumps({"detail": rejection.detail})
+            await send({
+                "type": "http.response.start",
+                "status": rejection.status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(rejection.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(pools, time.perf_counter() - started)
@@ -0,0 +1,237 @@
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+from .cache import catalog
+from .leaderboard import leaderboard
+from .versions import versions
+from .crud import (
+    UnknownQuestions,
+    _batch_ids,
+    _category_created,
+    _category_deleted,
+    _category_of_collection,
+    _collection_changed,
+    _collection_ids_of_category,
+    _collection_listing,
+    _delete_category,
+    _delete_quiz,
+    _delete_quiz_collection,
+    _detached,
+    _question_rows,
+    _question_batch,
+    _questions_changed,
+    _questions_in_collection,
+    _quiz_with_category,
+    _quiz_rows_by_category,
+    _quiz_rows_by_collection,
+    _result_row,
+    _results_recorded,
+    _results_page,
+)
+from typing import List, Optional
+import datetime
+
+# Async counterparts of crud.py, used when database.DB_ASYNC is set.
+# They share the same statements, cache keys and change notifications.
+
+async def _scalars(db: AsyncSession, stmt) -> list:
+    return list((await db.execute(stmt)).scalars().all())
+
+# Category CRUD
+
+async def get_categories(db: AsyncSession) -> List[models.Category]:
+    async def load():
+        return _detached(db, await _scalars(db, select(models.Category)))
+    return await catalog.aget_or_load(("categories",), load)
+
+async def create_category(db: AsyncSession, category: schemas.CategoryCreate) -> models.Category:
+    db_category = models.Category(name=category.name)
+    db.add(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    _category_created()
+    return db_category
+
+async def delete_category(db: AsyncSession, category_id: int) -> bool:
+    collection_ids = await _scalars(db, _collection_ids_of_category(category_id))
+    deleted = (await db.execute(_delete_category(category_id))).rowcount
+    await db.commit()
+    if not deleted:
+        return False
+    _category_deleted(category_id, collection_ids)
+    return True
+
+# Quiz Collection CRUD
+
+async def get_quiz_collections_by_category(db: AsyncSession, category_id: int) -> List[models.QuizCollection]:
+    async def load():
+        return _detached(db, await _scalars(
+            db, select(models.QuizCollection).where(models.QuizCollection.category_id == category_id)
+        ))
+    return await catalog.aget_or_load(("collections", category_id), load)
+
+async def list_quiz_collections(
+    db: AsyncSession,
+    category_id: int,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    sort: str = "id",
+) -> list:
+    result = await db.execute(_collection_listing(category_id, limit, after_id, sort))
+    return result.mappings().all()
+
+async def create_quiz_collection(db: AsyncSession, collection_data: schemas.QuizCollectionCreate) -> Optional[models.QuizCollection]:
+    db_collection = models.QuizCollection(
+        title=collection_data.title,
+        description=collection_data.description,
+        difficulty=collection_data.difficulty,
+        category_id=collection_data.category_id
+    )
+    db.add(db_collection)
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        return None
+
+    rows = _question_rows(collection_data.questions, db_collection.id)
+    if rows:
+        await db.execute(insert(models.Quiz), rows)
+
+    await db.commit()
+    await db.refresh(db_collection)
+    _collection_changed(db_collection.category_id, db_collection.id)
+    return db_collection
+
+async def get_quiz_collection(db: AsyncSession, collection_id: int) -> Optional[models.QuizCollection]:
+    return await db.get(models.QuizCollection, collection_id)
+
+async def delete_quiz_collection(db: AsyncSession, collection_id: int) -> bool:
+    category_id = (await db.execute(_delete_quiz_collection(collection_id))).scalar_one_or_none()
+    await db.commit()
+    if category_id is None:
+        return False
+    _collection_changed(category_id, collection_id)
+    return True
+
+# Quiz CRUD (for individual questions)
+
+async def get_quizzes_by_collection(db: AsyncSession, collection_id: int) -> List[models.Quiz]:
+    async def load():
+        return _detached(db, await _scalars(
+            db, select(models.Quiz).where(models.Quiz.collection_id == collection_id).order_by(models.Quiz.id)
+        ))
+    return await catalog.aget_or_load(("quizzes", collection_id), load)
+
+async def get_quiz_rows_by_collection(db: AsyncSession, collection_id: int) -> list:
+    version, _ = versions.get(("questions", collection_id))
+    async def load():
+        return (await db.execute(_quiz_rows_by_collection(collection_id))).all()
+    return await catalog.aget_or_load(("quiz_rows", collection_id, version), load)
+
+async def get_quiz_rows_by_category(db: AsyncSession, category_id: int) -> list:
+    return (await db.execute(_quiz_rows_by_category(category_id))).all()
+
+async def iter_quiz_rows_by_category(db: AsyncSession, category_id: int, batch_size: int = 500):
+    result = await db.stream(_quiz_rows_by_category(category_id).execution_options(yield_per=batch_size))
+    async for row in result:
+        yield row
+
+async def create_quiz(db: AsyncSession, quiz: schemas.QuizCreate) -> Optional[models.Quiz]:
+    db_quiz = models.Quiz(
+        question=quiz.question,
+        option1=quiz.options[0],
+        option2=quiz.options[1],
+        option3=quiz.options[2],
+        option4=quiz.options[3],
+        correct_answer=quiz.correct_answer,
+        collection_id=quiz.collection_id
+    )
+    db.add(db_quiz)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    await db.refresh(db_quiz)
+    category_id = (await db.execute(_category_of_collection(db_quiz.collection_id))).scalar_one_or_none()
+    _questions_changed(category_id, db_quiz.collection_id)
+    return db_quiz
+
+async def update_quiz(db: AsyncSession, quiz_id: int, quiz: schemas.QuizUpdate) -> Optional[models.Quiz]:
+    row = (await db.execute(_quiz_with_category(quiz_id))).first()
+    if row is None:
+        return None
+    db_quiz, category_id = row
+    if quiz.question is not None:
+        db_quiz.question = quiz.question
+    if quiz.options is not None:
+        db_quiz.option1 = quiz.options[0]
+        db_quiz.option2 = quiz.options[1]
+        db_quiz.option3 = quiz.options[2]
+        db_quiz.option4 = quiz.options[3]
+    if quiz.correct_answer is not None:
+        db_quiz.correct_answer = quiz.correct_answer
+    await db.commit()
+    await db.refresh(db_quiz)
+    _questions_changed(category_id, db_quiz.collection_id, count_changed=False)
+    return db_quiz
+
+async def delete_quiz(db: AsyncSession, quiz_id: int) -> bool:
+    collection_id = (await db.execute(_delete_quiz(quiz_id))).scalar_one_or_none()
+    if collection_id is None:
+        await db.rollback()
+        return False
+    category_id = (await db.execute(_category_of_collection(collection_id))).scalar_one_or_none()
+    await db.commit()
+    _questions_changed(category_id, collection_id)
+    return True
+
+async def apply_question_batch(db: AsyncSession, collection_id: int, batch: schemas.QuestionBatch) -> Optional[list]:
+    ids = _batch_ids(batch)
+    category_id = (await db.execute(_category_of_collection(collection_id))).scalar_one_or_none()
+    if category_id is None:
+        await db.rollback()
+        return None
+    if ids:
+        found = set((await db.execute(_questions_in_collection(collection_id, ids))).scalars())
+        if len(found) != len(ids):
+            await db.rollback()
+            raise UnknownQuestions(sorted(set(ids) - found))
+    for stmt, params in _question_batch(collection_id, batch):
+        await db.execute(stmt, params)
+    rows = (await db.execute(_quiz_rows_by_collection(collection_id))).all()
+    await db.commit()
+    _questions_changed(category_id, collection_id, count_changed=bool(batch.create or batch.delete))
+    return rows
+
+async def get_quiz_by_id(db: AsyncSession, quiz_id: int) -> Optional[models.Quiz]:
+    return await db.get(models.Quiz, quiz_id)
+
+# Result CRUD
+
+async def create_result(db: AsyncSession, result: schemas.ResultCreate) -> models.Result:
+    db_result = models.Result(
+        username=result.username,
+        score=result.score,
+        total_questions=result.total_questions,
+        timestamp=datetime.datetime.utcnow()
+    )
+    db.add(db_result)
+    rows = [_result_row(db_result)]
+    await db.run_sync(leaderboard.persist, rows)
+    await db.commit()
+    await db.refresh(db_result)
+    _results_recorded(rows, [db_result.id])
+    return db_result
+
+async def get_results(
+    db: AsyncSession,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    username: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+) -> List[models.Result]:
+    return await _scalars(db, _results_page(limit, cursor, username, since, until))
@@ -0,0 +1,247 @@
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from . import crud, models
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+# Bulk import of question banks from JSON Lines or CSV.
+#
+# Every record is either a whole collection
+#     {"title", "description", "difficulty", "category" | "category_id", "questions": [...]}
+# or a single question that names its collection
+#     {"title", "description", "difficulty", "category" | "category_id",
+#      "question", "options" | option1..option4, "correct_answer"}
+# CSV rows use the second, flat shape. Rows for the same (category, title)
+# land in one new collection. Categories given by name are created if missing.
+
+MAX_REPORTED_ERRORS = 100
+
+class RecordError(ValueError):
+    pass
+
+def _text(record: dict, field: str, default: Optional[str] = None) -> str:
+    value = record.get(field, default)
+    if not isinstance(value, str) or not value.strip():
+        raise RecordError(f"'{field}' must be a non-empty string")
+    return value
+
+def _question(record: dict) -> dict:
+    options = record.get("options")
+    if options is None:
+        options = [record.get(f"option{i}") for i in range(1, 5)]
+    if not isinstance(options, list) or len(options) != 4 or not all(isinstance(o, str) and o for o in options):
+        raise RecordError("a question needs exactly 4 non-empty options")
+    correct_answer = _text(record, "correct_answer")
+    if correct_answer not in options:
+        raise RecordError("'correct_answer' must be one of the options")
+    return {
+        "question": _text(record, "question"),
+        "option1": options[0],
+        "option2": options[1],
+        "option3": options[2],
+        "option4": options[3],
+        "correct_answer": correct_answer,
+    }
+
+def _category_ref(record: dict):
+    if record.get("category_id") not in (None, ""):
+        try:
+            return int(record["category_id"])
+        except (TypeError, ValueError):
+            raise RecordError("'category_id' must be an integer")
+    return _text(record, "category")
+
+def parse_jsonl(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_no, RecordError(f"invalid JSON: {exc.msg}")
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+PARSERS = {"jsonl": parse_jsonl, "csv": parse_csv}
+
+class BulkImporter:
+    """Validates records as they stream in and writes them in chunks.
+
+    Each chunk of up to ``chunk_size`` questions is one transaction: new
+    categories and collections are inserted first, then all questions with a
+    single executemany INSERT.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = 1000):
+        self.db = db
+        self.chunk_size = chunk_size
+        self._categories: Dict[object, int] = {}
+        self._collections: Dict[Tuple[int, str], int] = {}
+        self._pending_categories: Dict[str, None] = {}
+        self._pending_collections: Dict[Tuple[object, str], dict] = {}
+        self._pending_questions: List[Tuple[Tuple[object, str], dict]] = []
+        self._started = time.perf_counter()
+        self.report = {
+            "records": 0,
+            "questions": 0,
+            "collections": 0,
+            "categories_created": 0,
+            "chunks": 0,
+            "errors": [],
+            "error_count": 0,
+        }
+
+    def _error(self, line_no: int, message: str) -> None:
+        self.report["error_count"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append({"line": line_no, "error": message})
+
+    def _resolve_category(self, ref) -> None:
+        if ref in self._categories or ref in self._pending_categories:
+            return
+        if isinstance(ref, int):
+            exists = self.db.execute(select(models.Category.id).where(models.Category.id == ref)).scalar()
+            if exists is None:
+                raise RecordError(f"category {ref} does not exist")
+            self._categories[ref] = ref
+            return
+        existing = self.db.execute(select(models.Category.id).where(models.Category.name == ref)).scalar()
+        if existing is not None:
+            self._categories[ref] = existing
+        else:
+            self._pending_categories[ref] = None
+
+    def add(self, line_no: int, record) -> None:
+        self.report["records"] += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise RecordError("record must be an object")
+            category = _category_ref(record)
+            title = _text(record, "title")
+            collection = {
+                "title": title,
+                "description": record.get("description") or "",
+                "difficulty": record.get("difficulty") or "Medium",
+            }
+            if "questions" in record:
+                if not isinstance(record["questions"], list):
+                    raise RecordError("'questions' must be a list")
+                if not all(isinstance(q, dict) for q in record["questions"]):
+                    raise RecordError("each question must be an object")
+                questions = [_question(q) for q in record["questions"]]
+            else:
+                questions = [_question(record)]
+            self._resolve_category(category)
+        except RecordError as exc:
+            self._error(line_no, str(exc))
+            return
+        key = (category, title)
+        self._pending_collections.setdefault(key, collection)
+        self._pending_questions.extend((key, q) for q in questions)
+        if len(self._pending_questions) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending_questions and not self._pending_collections:
+            return
+        db = self.db
+        categories_before = dict(self._categories)
+        collections_before = dict(self._collections)
+        new_collections: List[Tuple[int, int]] = []
+        try:
+            for name in self._pending_categories:
+                self._categories[name] = db.execute(
+                    insert(models.Category).values(name=name)
+                ).inserted_primary_key[0]
+            created_categories = len(self._pending_categories)
+
+            for (category, title), collection in self._pending_collections.items():
+                category_id = self._categories[category]
+                if (category_id, title) in self._collections:
+                    continue
+                collection_id = db.execute(
+                    insert(models.QuizCollection).values(category_id=category_id, **collection)
+                ).inserted_primary_key[0]
+                self._collections[(category_id, title)] = collection_id
+                new_collections.append((category_id, collection_id))
+
+            rows = [
+                {**question, "collection_id": self._collections[(self._categories[category], title)]}
+                for (category, title), question in self._pending_questions
+            ]
+            if rows:
+                db.execute(insert(models.Quiz), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._categories = categories_before
+            self._collections = collections_before
+            raise
+
+        self.report["categories_created"] += created_categories
+        self.report["collections"] += len(new_collections)
+        self.report["questions"] += len(rows)
+        self.report["chunks"] += 1
+
+        if created_categories:
+            crud._category_created()
+        touched = {
+            (self._categories[category], self._collections[(self._categories[category], title)])
+            for (category, title), _ in self._pending_questions
+        } | set(new_collections)
+        for category_id, collection_id in touched:
+            crud._collection_changed(category_id, collection_id)
+
+        self._pending_categories = {}
+        self._pending_collections = {}
+        self._pending_questions = []
+
+    def finish(self) -> dict:
+        self.flush()
+        elapsed = time.perf_counter() - self._started
+        self.report["seconds"] = round(elapsed, 3)
+        self.report["questions_per_second"] = round(self.report["questions"] / elapsed, 1) if elapsed > 0 else None
+        return self.report
+
+def import_stream(db: Session, stream: IO[str], fmt: str = "jsonl", chunk_size: int = 1000) -> dict:
+    importer = BulkImporter(db, chunk_size=chunk_size)
+    for line_no, record in PARSERS[fmt](stream):
+        importer.add(line_no, record)
+    return importer.finish()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .database import SessionLocal, engine
+    from .migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Bulk import quiz collections from JSON Lines or CSV.")
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=sorted(PARSERS), help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        if args.path == "-":
+            report = import_stream(db, io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline=""), fmt, args.chunk_size)
+        else:
+            with open(args.path, encoding="utf-8", newline="") as stream:
+                report = import_stream(db, stream, fmt, args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
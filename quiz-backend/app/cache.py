@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+from .versions import versions
+import os
+import threading
+import time
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, follow: Optional[Callable[[], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Optional counter shared with other processes; the cache is cleared
+        # whenever it moves, so their writes are seen here too
+        self._follow = follow
+        self._followed = follow() if follow is not None else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _lookup(self, key: Hashable) -> tuple:
+        now = time.monotonic()
+        followed = self._follow() if self._follow is not None else None
+        with self._lock:
+            if followed != self._followed:
+                self._followed = followed
+                self._generation += 1
+                self.invalidations += len(self._data)
+                self._data.clear()
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1], None
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None, self._generation
+
+    def _store(self, key: Hashable, value: Any, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+        value = loader()
+        self._store(key, value, generation)
+        return value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+        value = await loader()
+        self._store(key, value, generation)
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+# Categories, collections and questions, keyed as
+# ("categories",), ("collections", category_id) and ("quizzes", collection_id).
+# With shared versions (several workers) any catalog write, by any worker,
+# clears it in every worker.
+catalog = TTLCache(
+    maxsize=int(os.environ.get("CATALOG_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("CATALOG_CACHE_TTL", 60)),
+    follow=(lambda: versions.get(("catalog",))[0]) if versions.shared else None,
+)
@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+from .versions import versions
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import gzip
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Encoded bodies of the large question-set responses, kept per resource.
+#
+# Each resource (the same keys versions.py uses) holds one body per content
+# encoding, tagged with the resource version it was built from. A request
+# whose version matches is answered with the stored bytes, so a hot
+# collection is serialized once and compressed once per encoding per change.
+# Memory is bounded by a byte budget with LRU eviction; the crud change
+# notifications drop a resource's bodies as soon as it changes.
+
+# Off by default: cached routes skip response_model validation, and with
+# several workers the versions must be shared (see versions.py)
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 0))
+# Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESS_MIN_SIZE = int(os.environ.get("RESPONSE_COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+IDENTITY = "identity"
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate(accept_encoding: Optional[str]) -> str:
+    """Pick br or gzip per the client's Accept-Encoding q-values, else identity."""
+    if not accept_encoding:
+        return IDENTITY
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = IDENTITY, 0.0
+    # ENCODINGS is in preference order, so ties go to the smaller output
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class BodyCache:
+    """Thread-safe LRU of (resource, encoding) -> (version, body) under a byte budget."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[Hashable, str], Tuple[int, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, resource: Hashable, version: int, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get((resource, encoding))
+            if entry is not None and entry[0] == version:
+                self._data.move_to_end((resource, encoding))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, resource: Hashable, version: int, encoding: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        key = (resource, encoding)
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None:
+                if old[0] > version:
+                    return  # a request that read a newer version got here first
+                self._bytes -= len(old[1])
+            self._data[key] = (version, body)
+            self._data.move_to_end(key)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, *resources: Hashable) -> None:
+        with self._lock:
+            for resource in resources:
+                for encoding in (IDENTITY,) + ENCODINGS:
+                    entry = self._data.pop((resource, encoding), None)
+                    if entry is not None:
+                        self._bytes -= len(entry[1])
+                        self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+# None unless RESPONSE_CACHE_BYTES is set
+body_cache = BodyCache(RESPONSE_CACHE_BYTES) if RESPONSE_CACHE_BYTES > 0 else None
+
+def invalidate(*resources: Hashable) -> None:
+    if body_cache is not None:
+        body_cache.invalidate(*resources)
+
+def _encoded(resource: Hashable, version: int, encoding: str, identity: bytes) -> Tuple[bytes, str]:
+    if encoding == IDENTITY or len(identity) < RESPONSE_COMPRESS_MIN_SIZE:
+        return identity, IDENTITY
+    body = _compress(identity, encoding)
+    body_cache.put(resource, version, encoding, body)
+    return body, encoding
+
+def _response(body: bytes, encoding: str, response: Optional[Response]) -> Response:
+    headers = dict(response.headers) if response is not None else {}
+    headers["Vary"] = "Accept-Encoding"
+    if encoding != IDENTITY:
+        headers["Content-Encoding"] = encoding
+        # The compressed bytes differ from the identity ones, so the tag is weak
+        if "etag" in headers and not headers["etag"].startswith("W/"):
+            headers["etag"] = "W/" + headers["etag"]
+    return Response(body, media_type="application/json", headers=headers)
+
+def cached_response(
+    request: Request, response: Optional[Response], resource: Hashable, load: Callable[[], bytes]
+) -> Response:
+    """Serve ``resource`` from the cache in the best encoding the client accepts.
+
+    ``load`` returns the JSON body; it runs only when the resource changed or
+    was evicted. The version is read first, so a concurrent write can only
+    leave a body filed under an older version than its data.
+    """
+    version, _ = versions.get(resource)
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    body = body_cache.get(resource, version, encoding)
+    if body is not None:
+        return _response(body, encoding, response)
+    identity = body_cache.get(resource, version, IDENTITY)
+    if identity is None:
+        identity = load()
+        body_cache.put(resource, version, IDENTITY, identity)
+    return _response(*_encoded(resource, version, encoding, identity), response)
+
+async def acached_response(
+    request: Request, response: Optional[Response], resource: Hashable, load: Callable[[], Awaitable[bytes]]
+) -> Response:
+    version, _ = versions.get(resource)
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    body = body_cache.get(resource, version, encoding)
+    if body is not None:
+        return _response(body, encoding, response)
+    identity = body_cache.get(resource, version, IDENTITY)
+    if identity is None:
+        identity = await load()
+        body_cache.put(resource, version, IDENTITY, identity)
+    # Compressing a large body would stall the event loop
+    encoded = await run_in_threadpool(_encoded, resource, version, encoding, identity)
+    return _response(*encoded, response)
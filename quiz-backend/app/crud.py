@@ -1,34 +1,204 @@
+from sqlalchemy import bindparam, delete, func, insert, select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from . import models, schemas
-from typing import List, Optional
+from . import compression, events, models, schemas, snapshot
+from .cache import catalog
+from .leaderboard import leaderboard
+from .versions import versions
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import base64
+import binascii
 import datetime
 
+def _detached(db: Session, objs: list) -> list:
+    # Cached ORM rows are shared across sessions, so they must not be expired
+    # or lazy-loaded by whichever session happened to load them.
+    for obj in objs:
+        db.expunge(obj)
+    return objs
+
+# Catalog change notifications, shared with async_crud. Called after commit.
+# ("category_questions", category_id) versions the /quizzes?category= listing;
+# ("catalog",) moves on every catalog write, for caches without finer keys.
+
+def _category_created() -> None:
+    catalog.invalidate(("categories",))
+    versions.bump(("catalog",), ("categories",))
+    snapshot.invalidate()
+    events.publish_catalog("categories")
+
+def _category_deleted(category_id: int, collection_ids: List[int]) -> None:
+    catalog.invalidate(
+        ("categories",),
+        ("collections", category_id),
+        *[("quizzes", cid) for cid in collection_ids],
+    )
+    changed = [("questions", cid) for cid in collection_ids] + [("category_questions", category_id)]
+    versions.bump(("catalog",), ("categories",), ("collections", category_id), *changed)
+    compression.invalidate(*changed)
+    snapshot.invalidate()
+    events.publish_catalog("categories")
+    events.publish_catalog("collections", category_id=category_id)
+
+def _collection_changed(category_id: int, collection_id: int) -> None:
+    catalog.invalidate(("collections", category_id), ("quizzes", collection_id))
+    changed = (("questions", collection_id), ("category_questions", category_id))
+    versions.bump(("catalog",), ("collections", category_id), *changed)
+    compression.invalidate(*changed)
+    snapshot.invalidate()
+    events.publish_catalog("collections", category_id=category_id)
+    events.publish_catalog("questions", collection_id=collection_id)
+
+def _questions_changed(category_id: int, collection_id: int, count_changed: bool = True) -> None:
+    catalog.invalidate(("quizzes", collection_id))
+    changed = (("questions", collection_id), ("category_questions", category_id))
+    if count_changed:
+        # The collection listing carries question_count, so it changes too
+        versions.bump(("catalog",), ("collections", category_id), *changed)
+    else:
+        versions.bump(("catalog",), *changed)
+    compression.invalidate(*changed)
+    snapshot.invalidate()
+    if count_changed:
+        events.publish_catalog("collections", category_id=category_id)
+    events.publish_catalog("questions", collection_id=collection_id)
+
+def _results_recorded(rows: List[dict], ids: List[int]) -> None:
+    # After commit: update the in-memory boards and notify live subscribers
+    leaderboard.record(rows)
+    events.publish_results(rows, ids)
+
 # Category CRUD
 
 def get_categories(db: Session) -> List[models.Category]:
-    return db.query(models.Category).all()
+    return catalog.get_or_load(
+        ("categories",),
+        lambda: _detached(db, db.query(models.Category).all()),
+    )
 
 def create_category(db: Session, category: schemas.CategoryCreate) -> models.Category:
     db_category = models.Category(name=category.name)
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
+    _category_created()
     return db_category
 
+def _delete_category(category_id: int):
+    # One statement; ON DELETE CASCADE removes the collections and their questions
+    return (
+        delete(models.Category)
+        .where(models.Category.id == category_id)
+        .execution_options(synchronize_session=False)
+    )
+
+def _collection_ids_of_category(category_id: int):
+    return select(models.QuizCollection.id).where(models.QuizCollection.category_id == category_id)
+
 def delete_category(db: Session, category_id: int) -> bool:
-    category = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if category:
-        db.delete(category)
-        db.commit()
-        return True
-    return False
+    collection_ids = db.execute(_collection_ids_of_category(category_id)).scalars().all()
+    deleted = db.execute(_delete_category(category_id)).rowcount
+    db.commit()
+    if not deleted:
+        return False
+    _category_deleted(category_id, collection_ids)
+    return True
 
 # Quiz Collection CRUD
 
 def get_quiz_collections_by_category(db: Session, category_id: int) -> List[models.QuizCollection]:
-    return db.query(models.QuizCollection).filter(models.QuizCollection.category_id == category_id).all()
+    return catalog.get_or_load(
+        ("collections", category_id),
+        lambda: _detached(
+            db, db.query(models.QuizCollection).filter(models.QuizCollection.category_id == category_id).all()
+        ),
+    )
+
+COLLECTION_SORTS = {
+    "id": (models.QuizCollection.id, False),
+    "-id": (models.QuizCollection.id, True),
+    "created_at": (models.QuizCollection.created_at, False),
+    "-created_at": (models.QuizCollection.created_at, True),
+    "title": (models.QuizCollection.title, False),
+    "-title": (models.QuizCollection.title, True),
+}
+
+def _collection_listing(
+    category_id: int,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    sort: str = "id",
+):
+    # One SELECT: question_count comes from a correlated subquery instead of
+    # loading every Quiz row per collection.
+    question_count = (
+        select(func.count(models.Quiz.id))
+        .where(models.Quiz.collection_id == models.QuizCollection.id)
+        .correlate(models.QuizCollection)
+        .scalar_subquery()
+        .label("question_count")
+    )
+    column, descending = COLLECTION_SORTS[sort]
+    stmt = select(
+        models.QuizCollection.id,
+        models.QuizCollection.title,
+        models.QuizCollection.description,
+        models.QuizCollection.difficulty,
+        models.QuizCollection.category_id,
+        models.QuizCollection.created_at,
+        question_count,
+    ).where(models.QuizCollection.category_id == category_id)
+
+    if after_id is not None:
+        # Keyset pagination on (sort column, id); the cursor row's sort value is
+        # looked up inline so the client only has to send the last id it saw.
+        cursor_value = (
+            select(column)
+            .where(models.QuizCollection.id == after_id)
+            .scalar_subquery()
+        )
+        if column is models.QuizCollection.id:
+            stmt = stmt.where(column < after_id if descending else column > after_id)
+        elif descending:
+            stmt = stmt.where(or_(
+                column < cursor_value,
+                and_(column == cursor_value, models.QuizCollection.id < after_id),
+            ))
+        else:
+            stmt = stmt.where(or_(
+                column > cursor_value,
+                and_(column == cursor_value, models.QuizCollection.id > after_id),
+            ))
+
+    if descending:
+        stmt = stmt.order_by(column.desc(), models.QuizCollection.id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), models.QuizCollection.id.asc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def list_quiz_collections(
+    db: Session,
+    category_id: int,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    sort: str = "id",
+) -> list:
+    return db.execute(_collection_listing(category_id, limit, after_id, sort)).mappings().all()
 
-def create_quiz_collection(db: Session, collection_data: schemas.QuizCollectionCreate) -> models.QuizCollection:
+def _question_rows(questions: List[dict], collection_id: int) -> List[dict]:
+    return [{
+        "question": question_data["question"],
+        "option1": question_data["options"][0],
+        "option2": question_data["options"][1],
+        "option3": question_data["options"][2],
+        "option4": question_data["options"][3],
+        "correct_answer": question_data["correct_answer"],
+        "collection_id": collection_id,
+    } for question_data in questions]
+
+def create_quiz_collection(db: Session, collection_data: schemas.QuizCollectionCreate) -> Optional[models.QuizCollection]:
     # Create the collection
     db_collection = models.QuizCollection(
         title=collection_data.title,
@@ -37,43 +207,101 @@ def create_quiz_collection(db: Session, collection_data: schemas.QuizCollectionC
         category_id=collection_data.category_id
     )
     db.add(db_collection)
+    try:
+        db.flush()
+    except IntegrityError:
+        # No such category
+        db.rollback()
+        return None
+
+    # Create the questions with one executemany INSERT in the same transaction
+    rows = _question_rows(collection_data.questions, db_collection.id)
+    if rows:
+        db.execute(insert(models.Quiz), rows)
+
     db.commit()
     db.refresh(db_collection)
-    
-    # Create the questions
-    for question_data in collection_data.questions:
-        db_question = models.Quiz(
-            question=question_data["question"],
-            option1=question_data["options"][0],
-            option2=question_data["options"][1],
-            option3=question_data["options"][2],
-            option4=question_data["options"][3],
-            correct_answer=question_data["correct_answer"],
-            collection_id=db_collection.id
-        )
-        db.add(db_question)
-    
-    db.commit()
-    db.refresh(db_collection)
+    _collection_changed(db_collection.category_id, db_collection.id)
     return db_collection
 
 def get_quiz_collection(db: Session, collection_id: int) -> Optional[models.QuizCollection]:
     return db.query(models.QuizCollection).filter(models.QuizCollection.id == collection_id).first()
 
+def _delete_quiz_collection(collection_id: int):
+    # Questions go with it through ON DELETE CASCADE
+    return (
+        delete(models.QuizCollection)
+        .where(models.QuizCollection.id == collection_id)
+        .returning(models.QuizCollection.category_id)
+        .execution_options(synchronize_session=False)
+    )
+
 def delete_quiz_collection(db: Session, collection_id: int) -> bool:
-    collection = db.query(models.QuizCollection).filter(models.QuizCollection.id == collection_id).first()
-    if collection:
-        db.delete(collection)
-        db.commit()
-        return True
-    return False
+    category_id = db.execute(_delete_quiz_collection(collection_id)).scalar_one_or_none()
+    db.commit()
+    if category_id is None:
+        return False
+    _collection_changed(category_id, collection_id)
+    return True
 
 # Quiz CRUD (for individual questions)
 
 def get_quizzes_by_collection(db: Session, collection_id: int) -> List[models.Quiz]:
-    return db.query(models.Quiz).filter(models.Quiz.collection_id == collection_id).all()
+    return catalog.get_or_load(
+        ("quizzes", collection_id),
+        lambda: _detached(
+            db, db.query(models.Quiz).filter(models.Quiz.collection_id == collection_id).order_by(models.Quiz.id).all()
+        ),
+    )
 
-def create_quiz(db: Session, quiz: schemas.QuizCreate) -> models.Quiz:
+QUIZ_ROW_COLUMNS = (
+    models.Quiz.id,
+    models.Quiz.question,
+    models.Quiz.option1,
+    models.Quiz.option2,
+    models.Quiz.option3,
+    models.Quiz.option4,
+    models.Quiz.correct_answer,
+    models.Quiz.collection_id,
+)
+
+def _quiz_rows_by_collection(collection_id: int):
+    return (
+        select(*QUIZ_ROW_COLUMNS)
+        .where(models.Quiz.collection_id == collection_id)
+        .order_by(models.Quiz.id)
+    )
+
+def get_quiz_rows_by_collection(db: Session, collection_id: int) -> list:
+    # Column projection for the fast serialization path; keyed by the question
+    # version so writes never need to invalidate it explicitly
+    version, _ = versions.get(("questions", collection_id))
+    return catalog.get_or_load(
+        ("quiz_rows", collection_id, version),
+        lambda: db.execute(_quiz_rows_by_collection(collection_id)).all(),
+    )
+
+def _quiz_rows_by_category(category_id: int):
+    return (
+        select(*QUIZ_ROW_COLUMNS)
+        .join(models.QuizCollection, models.Quiz.collection_id == models.QuizCollection.id)
+        .where(models.QuizCollection.category_id == category_id)
+        .order_by(models.Quiz.collection_id, models.Quiz.id)
+    )
+
+def get_quiz_rows_by_category(db: Session, category_id: int) -> list:
+    # Plain row tuples in QUIZ_ROW_COLUMNS order, one joined query for the whole category
+    return db.execute(_quiz_rows_by_category(category_id)).all()
+
+def iter_quiz_rows_by_category(db: Session, category_id: int, batch_size: int = 500):
+    result = db.execute(_quiz_rows_by_category(category_id).execution_options(yield_per=batch_size))
+    for row in result:
+        yield row
+
+def _category_of_collection(collection_id: int):
+    return select(models.QuizCollection.category_id).where(models.QuizCollection.id == collection_id)
+
+def create_quiz(db: Session, quiz: schemas.QuizCreate) -> Optional[models.Quiz]:
     db_quiz = models.Quiz(
         question=quiz.question,
         option1=quiz.options[0],
@@ -84,14 +312,29 @@ def create_quiz(db: Session, quiz: schemas.QuizCreate) -> models.Quiz:
         collection_id=quiz.collection_id
     )
     db.add(db_quiz)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # No such collection
+        db.rollback()
+        return None
     db.refresh(db_quiz)
+    category_id = db.execute(_category_of_collection(db_quiz.collection_id)).scalar_one_or_none()
+    _questions_changed(category_id, db_quiz.collection_id)
     return db_quiz
 
+def _quiz_with_category(quiz_id: int):
+    return (
+        select(models.Quiz, models.QuizCollection.category_id)
+        .join(models.QuizCollection, models.Quiz.collection_id == models.QuizCollection.id)
+        .where(models.Quiz.id == quiz_id)
+    )
+
 def update_quiz(db: Session, quiz_id: int, quiz: schemas.QuizUpdate) -> Optional[models.Quiz]:
-    db_quiz = db.query(models.Quiz).filter(models.Quiz.id == quiz_id).first()
-    if not db_quiz:
+    row = db.execute(_quiz_with_category(quiz_id)).first()
+    if row is None:
         return None
+    db_quiz, category_id = row
     if quiz.question is not None:
         db_quiz.question = quiz.question
     if quiz.options is not None:
@@ -103,15 +346,100 @@ def update_quiz(db: Session, quiz_id: int, quiz: schemas.QuizUpdate) -> Optional
         db_quiz.correct_answer = quiz.correct_answer
     db.commit()
     db.refresh(db_quiz)
+    _questions_changed(category_id, db_quiz.collection_id, count_changed=False)
     return db_quiz
 
+def _delete_quiz(quiz_id: int):
+    return (
+        delete(models.Quiz)
+        .where(models.Quiz.id == quiz_id)
+        .returning(models.Quiz.collection_id)
+        .execution_options(synchronize_session=False)
+    )
+
 def delete_quiz(db: Session, quiz_id: int) -> bool:
-    db_quiz = db.query(models.Quiz).filter(models.Quiz.id == quiz_id).first()
-    if db_quiz:
-        db.delete(db_quiz)
-        db.commit()
-        return True
-    return False
+    collection_id = db.execute(_delete_quiz(quiz_id)).scalar_one_or_none()
+    if collection_id is None:
+        db.rollback()
+        return False
+    category_id = db.execute(_category_of_collection(collection_id)).scalar_one_or_none()
+    db.commit()
+    _questions_changed(category_id, collection_id)
+    return True
+
+class UnknownQuestions(LookupError):
+    def __init__(self, ids: List[int]):
+        super().__init__(f"questions not in this collection: {ids}")
+        self.ids = ids
+
+def _quiz_values(quiz) -> dict:
+    # Column values for the fields that were given
+    values = {}
+    if quiz.question is not None:
+        values["question"] = quiz.question
+    if quiz.options is not None:
+        values.update(option1=quiz.options[0], option2=quiz.options[1], option3=quiz.options[2], option4=quiz.options[3])
+    if quiz.correct_answer is not None:
+        values["correct_answer"] = quiz.correct_answer
+    return values
+
+def _batch_ids(batch: schemas.QuestionBatch) -> List[int]:
+    ids = [patch.id for patch in batch.update] + list(batch.delete)
+    if len(set(ids)) != len(ids):
+        raise ValueError("a question can be updated or deleted only once per batch")
+    return ids
+
+def _questions_in_collection(collection_id: int, ids: List[int]):
+    return select(models.Quiz.id).where(models.Quiz.collection_id == collection_id, models.Quiz.id.in_(ids))
+
+def _question_batch(collection_id: int, batch: schemas.QuestionBatch) -> List[tuple]:
+    """(statement, executemany parameters) pairs applying a batch, in order."""
+    table = models.Quiz.__table__
+    statements = []
+    if batch.delete:
+        statements.append((delete(table).where(table.c.id.in_(batch.delete)), None))
+    # One executemany UPDATE per distinct set of changed columns
+    groups: Dict[tuple, list] = {}
+    for patch in batch.update:
+        values = _quiz_values(patch)
+        if values:
+            groups.setdefault(tuple(sorted(values)), []).append(
+                {"b_id": patch.id, **{f"v_{column}": value for column, value in values.items()}}
+            )
+    for columns, params in groups.items():
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(
+            {column: bindparam(f"v_{column}") for column in columns}
+        )
+        statements.append((stmt, params))
+    if batch.create:
+        statements.append(
+            (insert(table), [{"collection_id": collection_id, **_quiz_values(quiz)} for quiz in batch.create])
+        )
+    return statements
+
+def apply_question_batch(db: Session, collection_id: int, batch: schemas.QuestionBatch) -> Optional[list]:
+    """Apply creates, updates and deletes in one transaction.
+
+    Returns the collection's questions afterwards as QUIZ_ROW_COLUMNS rows, or
+    None if there is no such collection. Raises UnknownQuestions when an update
+    or delete names a question outside the collection; nothing is applied then.
+    """
+    ids = _batch_ids(batch)
+    category_id = db.execute(_category_of_collection(collection_id)).scalar_one_or_none()
+    if category_id is None:
+        db.rollback()
+        return None
+    if ids:
+        found = set(db.execute(_questions_in_collection(collection_id, ids)).scalars())
+        if len(found) != len(ids):
+            db.rollback()
+            raise UnknownQuestions(sorted(set(ids) - found))
+    for stmt, params in _question_batch(collection_id, batch):
+        db.execute(stmt, params)
+    rows = db.execute(_quiz_rows_by_collection(collection_id)).all()
+    db.commit()
+    _questions_changed(category_id, collection_id, count_changed=bool(batch.create or batch.delete))
+    return rows
 
 def get_quiz_by_id(db: Session, quiz_id: int) -> Optional[models.Quiz]:
     return db.query(models.Quiz).filter(models.Quiz.id == quiz_id).first()
@@ -126,9 +454,100 @@ def create_result(db: Session, result: schemas.ResultCreate) -> models.Result:
         timestamp=datetime.datetime.utcnow()
     )
     db.add(db_result)
+    rows = [_result_row(db_result)]
+    leaderboard.persist(db, rows)
     db.commit()
     db.refresh(db_result)
+    _results_recorded(rows, [db_result.id])
     return db_result
 
-def get_results(db: Session) -> List[models.Result]:
-    return db.query(models.Result).order_by(models.Result.timestamp.desc()).all() 
\ No newline at end of file
+def _result_row(result) -> dict:
+    return {
+        "username": result.username,
+        "score": result.score,
+        "total_questions": result.total_questions,
+        "timestamp": result.timestamp,
+    }
+
+class AnswerSheets(NamedTuple):
+    collection_id: int
+    layout_id: int
+    answers: List[bytes]  # one packed sheet per result row
+
+def insert_results(db: Session, rows: List[dict], sheets: Optional[AnswerSheets] = None) -> List[int]:
+    # One multi-row INSERT for a whole batch of results, without committing,
+    # for callers that write more in the same transaction; they call
+    # _results_recorded() after their commit. Returns the new ids in the
+    # same order as ``rows``
+    if not rows:
+        return []
+    ids = db.execute(
+        insert(models.Result).returning(models.Result.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    if sheets is not None:
+        db.execute(insert(models.AnswerSheet), [
+            {"layout_id": sheets.layout_id, "result_id": result_id, "answers": answers}
+            for result_id, answers in zip(ids, sheets.answers)
+        ])
+    leaderboard.persist(db, rows)
+    return ids
+
+def create_results(db: Session, rows: List[dict], sheets: Optional[AnswerSheets] = None) -> List[int]:
+    # insert_results() plus one COMMIT
+    if not rows:
+        return []
+    ids = insert_results(db, rows, sheets)
+    db.commit()
+    if sheets is not None:
+        versions.bump(("answers", sheets.collection_id))
+    _results_recorded(rows, ids)
+    return ids
+
+def encode_result_cursor(result: models.Result) -> str:
+    raw = f"{result.timestamp.isoformat()}|{result.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_result_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    # Raises ValueError for anything that did not come from encode_result_cursor
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, result_id = raw.split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(result_id)
+    except (UnicodeDecodeError, TypeError, ValueError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+def _results_page(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    username: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+):
+    # Newest first, keyset on (timestamp, id) so each page is an index range scan
+    stmt = select(models.Result)
+    if username is not None:
+        stmt = stmt.where(models.Result.username == username)
+    if since is not None:
+        stmt = stmt.where(models.Result.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(models.Result.timestamp < until)
+    if cursor is not None:
+        timestamp, result_id = decode_result_cursor(cursor)
+        stmt = stmt.where(or_(
+            models.Result.timestamp < timestamp,
+            and_(models.Result.timestamp == timestamp, models.Result.id < result_id),
+        ))
+    stmt = stmt.order_by(models.Result.timestamp.desc(), models.Result.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def get_results(
+    db: Session,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    username: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+) -> List[models.Result]:
+    return db.execute(_results_page(limit, cursor, username, since, until)).scalars().all() 
\ No newline at end of file
@@ -1,10 +1,101 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from .models import Base
+import os
 
-SQLALCHEMY_DATABASE_URL = 'sqlite:///./quiz.db'
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", 'sqlite:///./quiz.db')
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+# In-memory SQLite shares one connection (StaticPool), so pool sizing does not apply
+IS_MEMORY_SQLITE = IS_SQLITE and (":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL in ("sqlite://", "sqlite:///"))
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+def _engine_options() -> dict:
+    options = {"pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True)}
+    if IS_SQLITE:
+        options["connect_args"] = {"check_same_thread": False}
+    if IS_MEMORY_SQLITE:
+        options["poolclass"] = StaticPool
+    else:
+        options["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+        options["pool_recycle"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+        options["pool_timeout"] = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    return options
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),  # negative = KiB
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 268435456)),
+    "temp_store": "MEMORY",
+    # Off by default in SQLite; the schema relies on ON DELETE CASCADE
+    "foreign_keys": "ON",
+}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _pool_stats(pool) -> dict:
+    stats = {"class": type(pool).__name__, "status": pool.status()}
+    # Only QueuePool-style pools expose sizing counters
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            stats[name] = counter()
+    return stats
+
+def pool_status() -> dict:
+    status = {"sync": _pool_stats(engine.pool)}
+    if async_engine is not None:
+        status["async"] = _pool_stats(async_engine.pool)
+    return status
+
+# Async mode: routers are served by async handlers on an AsyncEngine.
+# DB_ASYNC=1 turns it on; the sync engine above is still used for schema setup.
+DB_ASYNC = _env_bool("DB_ASYNC", False)
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith(("postgresql:", "postgres:")):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    async_options = _engine_options()
+    if IS_SQLITE and not IS_MEMORY_SQLITE:
+        # aiosqlite defaults to NullPool; use a real pool so the sizing options apply
+        async_options["poolclass"] = AsyncAdaptedQueuePool
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_options)
+    if IS_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    # expire_on_commit=False so returned objects can be serialized without an implicit await
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
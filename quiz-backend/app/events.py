@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from .fastjson import dumps
+from typing import Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import itertools
+import os
+import threading
+
+# In-process pub/sub for live results, leaderboard and catalog changes.
+#
+# Writers publish after commit, from request threads, the write-behind
+# thread or the event loop. A payload is encoded once and the same bytes are
+# queued for every subscriber, so a write costs O(subscribers) appends and
+# no queries. Each subscriber has a bounded queue: when it is full the
+# oldest event is dropped and the subscriber is told how many it missed.
+# Events published with a key (leaderboard and catalog notices) replace a
+# queued event with the same key, and a subscriber drains everything
+# pending per wakeup, so a burst of writes reaches it as one frame.
+
+TOPICS = ("results", "leaderboard", "catalog")
+QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", 256))
+MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", 1000))
+# How long a woken subscriber waits for the rest of a burst before sending
+LINGER = float(os.environ.get("EVENTS_LINGER", 0.05))
+LEADERBOARD_SIZE = 10
+
+class TooManySubscribers(Exception):
+    pass
+
+class Event(NamedTuple):
+    id: int
+    topic: str
+    key: Optional[Hashable]
+    data: bytes  # JSON payload
+    sse: bytes  # the same payload framed as a server-sent event
+
+class Subscription:
+    def __init__(self, topics: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self._pending: "OrderedDict[Hashable, Event]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def _offer(self, event: Event) -> Tuple[bool, bool]:
+        """Queue ``event``; returns (coalesced, dropped). Called under the broker lock."""
+        slot = ("key", event.key) if event.key is not None else event.id
+        coalesced = self._pending.pop(slot, None) is not None
+        self._pending[slot] = event
+        if len(self._pending) > QUEUE_SIZE:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+            return coalesced, True
+        return coalesced, False
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def wants(self, topic: str) -> bool:
+        # Lets publishers skip building payloads nobody is listening for
+        with self._lock:
+            return any(topic in sub.topics for sub in self._subscribers)
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Register a subscriber; must be called on the event loop that will read it."""
+        sub = Subscription(topics, asyncio.get_running_loop())
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                raise TooManySubscribers()
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+        sub.closed = True
+        _wake_one(sub)
+
+    def publish(self, topic: str, payload: dict, key: Optional[Hashable] = None) -> None:
+        if not self._subscribers:
+            return
+        event_id = next(self._ids)
+        data = dumps(payload)
+        event = Event(event_id, topic, key, data, b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, topic.encode(), data))
+        loops = set()
+        with self._lock:
+            self.published += 1
+            for sub in self._subscribers:
+                if topic in sub.topics:
+                    coalesced, dropped = sub._offer(event)
+                    self.coalesced += coalesced
+                    self.dropped += dropped
+                    loops.add(sub.loop)
+        for loop in loops:
+            if _running_loop() is loop:
+                self._wake(loop)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(self._wake, loop)
+
+    def _wake(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.loop is loop and sub._pending:
+                sub._ready.set()
+
+    def _drain(self, sub: Subscription) -> Tuple[List[Event], int]:
+        with self._lock:
+            events = list(sub._pending.values())
+            sub._pending.clear()
+            dropped, sub.dropped = sub.dropped, 0
+            self.delivered += len(events)
+        return events, dropped
+
+    async def next_batch(self, sub: Subscription, timeout: float) -> Optional[Tuple[List[Event], int]]:
+        """Everything pending for ``sub``, waiting up to ``timeout`` for the first event.
+
+        Returns None on timeout and ([], 0) once the subscription is closed.
+        """
+        while not sub.closed:
+            if not sub._pending:
+                try:
+                    await asyncio.wait_for(sub._ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return None
+                if LINGER > 0 and not sub.closed:
+                    await asyncio.sleep(LINGER)
+            sub._ready.clear()
+            events, dropped = self._drain(sub)
+            if events or dropped:
+                return events, dropped
+        return [], 0
+
+    def close(self) -> None:
+        """End every subscription, e.g. on shutdown."""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+        for sub in subscribers:
+            sub.closed = True
+            _wake_one(sub)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "delivered": self.delivered,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+            }
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _wake_one(sub: Subscription) -> None:
+    # asyncio.Event is not thread-safe; set it from the subscriber's own loop
+    if _running_loop() is sub.loop:
+        sub._ready.set()
+    elif not sub.loop.is_closed():
+        sub.loop.call_soon_threadsafe(sub._ready.set)
+
+broker = Broker()
+
+def dropped_notice(count: int) -> bytes:
+    return dumps({"type": "dropped", "count": count})
+
+# Publishers, called by crud after commit
+
+def publish_results(rows: List[dict], ids: List[int]) -> None:
+    if broker.wants("results"):
+        # Keys in ResultOut field order
+        results = [
+            {"username": row["username"], "score": row["score"], "total_questions": row["total_questions"],
+             "id": result_id, "timestamp": row["timestamp"]}
+            for row, result_id in zip(rows, ids)
+        ]
+        broker.publish("results", {"type": "results", "results": results})
+    if broker.wants("leaderboard"):
+        from .leaderboard import WINDOWS, leaderboard
+
+        boards = {}
+        for window in WINDOWS:
+            period, entries = leaderboard.top(window, LEADERBOARD_SIZE)
+            boards[window] = {"period": period, "entries": entries}
+        # Only the latest standings matter, so queued ones are replaced
+        broker.publish("leaderboard", {"type": "leaderboard", "boards": boards}, key="leaderboard")
+
+def publish_catalog(resource: str, **ids: int) -> None:
+    if broker.wants("catalog"):
+        broker.publish(
+            "catalog", {"type": "catalog", "resource": resource, **ids}, key=(resource, *sorted(ids.items()))
+        )
@@ -0,0 +1,41 @@
+from fastapi import Response
+from .database import _env_bool
+from typing import Any, Optional
+import datetime
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Opt-in fast path for the hot read routes: rows are projected straight from
+# SQL into plain dicts and encoded here, skipping response_model validation.
+# The output must stay byte-identical to what FastAPI's JSONResponse produces
+# for the same schema, so dict keys are built in schema field order.
+FAST_JSON = _env_bool("FAST_JSON", False)
+
+def _default(value: Any):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    # Same settings as starlette.responses.JSONResponse
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def fast_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    # Returning a Response bypasses FastAPI's merge of the injected response,
+    # so carry over headers such as ETag that the route already set on it.
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(content, headers=headers)
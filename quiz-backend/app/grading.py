@@ -0,0 +1,120 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import models
+from .cache import catalog
+from .versions import versions
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+# Answers are option indices 0-3 in question-id order (the order
+# /quiz-collections/{id}/questions returns them); None means unanswered.
+UNANSWERED = -1
+# Key value for a question whose correct_answer matches none of its options,
+# so that no submitted answer (including "unanswered") can match it
+NO_KEY = -2
+
+class AnswerKey(NamedTuple):
+    question_ids: Tuple[int, ...]
+    key: np.ndarray  # int8, one correct option index per question
+
+def _compile(db: Session, collection_id: int) -> AnswerKey:
+    rows = db.execute(
+        select(
+            models.Quiz.id,
+            models.Quiz.option1,
+            models.Quiz.option2,
+            models.Quiz.option3,
+            models.Quiz.option4,
+            models.Quiz.correct_answer,
+        )
+        .where(models.Quiz.collection_id == collection_id)
+        .order_by(models.Quiz.id)
+    ).all()
+    key = np.full(len(rows), NO_KEY, dtype=np.int8)
+    for i, (_, *options, correct_answer) in enumerate(rows):
+        if correct_answer in options:
+            key[i] = options.index(correct_answer)
+    key.flags.writeable = False
+    return AnswerKey(tuple(row[0] for row in rows), key)
+
+def answer_key(db: Session, collection_id: int) -> AnswerKey:
+    # Keyed by the collection's question version, so any question write
+    # makes the next lookup recompile instead of needing its own invalidation
+    version, _ = versions.get(("questions", collection_id))
+    return catalog.get_or_load(
+        ("answer_key", collection_id, version),
+        lambda: _compile(db, collection_id),
+    )
+
+class InvalidAnswers(ValueError):
+    pass
+
+def answer_matrix(submissions: Sequence[Sequence[Optional[int]]], question_count: int) -> np.ndarray:
+    for row, answers in enumerate(submissions):
+        if len(answers) != question_count:
+            raise InvalidAnswers(
+                f"submission {row} has {len(answers)} answers, expected {question_count}"
+            )
+    try:
+        matrix = np.array(
+            [[UNANSWERED if answer is None else answer for answer in answers] for answers in submissions],
+            dtype=np.int64,
+        ).reshape(len(submissions), question_count)
+    except OverflowError:
+        raise InvalidAnswers("answers must be option indices 0-3")
+    invalid = np.argwhere((matrix < UNANSWERED) | (matrix > 3))
+    if len(invalid):
+        row, col = invalid[0]
+        raise InvalidAnswers(f"submission {row} answer {col} must be an option index 0-3")
+    return matrix.astype(np.int8)
+
+def grade_matrix(key: AnswerKey, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    correct = matrix == key.key
+    return correct.sum(axis=1), correct
+
+def grade(key: AnswerKey, submissions: Sequence[Sequence[Optional[int]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Score many submissions at once.
+
+    Returns (scores, correct) where ``correct`` is the boolean answer matrix
+    compared against the key and ``scores`` its row sums.
+    """
+    return grade_matrix(key, answer_matrix(submissions, len(key.key)))
+
+def pack_question_ids(question_ids: Sequence[int]) -> bytes:
+    return np.asarray(question_ids, dtype="<i4").tobytes()
+
+def _layout_id(db: Session, collection_id: int, question_ids: Tuple[int, ...]) -> int:
+    packed = pack_question_ids(question_ids)
+    stmt = select(models.AnswerLayout.id).where(
+        models.AnswerLayout.collection_id == collection_id,
+        models.AnswerLayout.question_ids == packed,
+    )
+    layout_id = db.execute(stmt).scalar_one_or_none()
+    if layout_id is None:
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        db.execute(
+            insert(models.AnswerLayout)
+            .values(collection_id=collection_id, question_ids=packed)
+            .on_conflict_do_nothing(index_elements=["collection_id", "question_ids"])
+        )
+        # Committed on its own, so the cached id never points at a row that
+        # a failed grading transaction rolled back
+        db.commit()
+        layout_id = db.execute(stmt).scalar_one()
+    return layout_id
+
+def layout_id(db: Session, collection_id: int, key: AnswerKey) -> int:
+    """Id of the answer layout for the question set ``key`` was compiled from."""
+    return catalog.get_or_load(
+        ("answer_layout", collection_id, key.question_ids),
+        lambda: _layout_id(db, collection_id, key.question_ids),
+    )
+
+def grade_rows(usernames: List[str], scores: np.ndarray, total_questions: int, timestamp) -> List[dict]:
+    return [
+        {"username": username, "score": int(score), "total_questions": total_questions, "timestamp": timestamp}
+        for username, score in zip(usernames, scores)
+    ]
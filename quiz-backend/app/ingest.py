@@ -0,0 +1,135 @@
+from . import crud, schemas
+from .database import SessionLocal, _env_bool
+from typing import Optional
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+class ResultBatcher:
+    """Write-behind queue for POST /results.
+
+    Submissions are buffered in a bounded queue and a background thread writes
+    them with one multi-row INSERT and one COMMIT per batch. A batch is flushed
+    when it reaches ``max_batch`` rows or ``flush_interval`` seconds after its
+    first row arrived, whichever comes first.
+    """
+
+    def __init__(self, max_batch: int = 500, flush_interval: float = 0.05, max_pending: int = 10000):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="result-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, result: schemas.ResultCreate, timeout: float = 0.5) -> str:
+        receipt = uuid.uuid4().hex
+        row = {
+            "username": result.username,
+            "score": result.score,
+            "total_questions": result.total_questions,
+            # Stamped on arrival, not when the batch happens to be written
+            "timestamp": datetime.datetime.utcnow(),
+        }
+        try:
+            if timeout > 0:
+                self._queue.put(row, timeout=timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFull()
+        self.accepted += 1
+        return receipt
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "max_pending": self._queue.maxsize,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    row = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            self._flush(batch)
+        # Drain whatever was queued behind the stop sentinel
+        leftover = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                leftover.append(row)
+        for start in range(0, len(leftover), self.max_batch):
+            self._flush(leftover[start:start + self.max_batch])
+
+    def _flush(self, batch: list) -> None:
+        db = SessionLocal()
+        try:
+            crud.create_results(db, batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception:
+            db.rollback()
+            self.failed += len(batch)
+            logger.exception("Failed to write %d queued results", len(batch))
+        finally:
+            db.close()
+
+def _make_batcher() -> Optional[ResultBatcher]:
+    if not _env_bool("RESULTS_WRITE_BEHIND", False):
+        return None
+    return ResultBatcher(
+        max_batch=int(os.environ.get("RESULTS_BATCH_SIZE", 500)),
+        flush_interval=float(os.environ.get("RESULTS_FLUSH_INTERVAL", 0.05)),
+        max_pending=int(os.environ.get("RESULTS_MAX_PENDING", 10000)),
+    )
+
+# None unless RESULTS_WRITE_BEHIND is set; POST /results then returns a 202 receipt
+results_batcher = _make_batcher()
@@ -0,0 +1,131 @@
+from itertools import groupby
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import grading, models
+from .cache import catalog
+from .versions import versions
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+# Classical item analysis over a collection's stored answer sheets.
+#
+# Sheets are grouped by layout (the question set they were answered against)
+# and each group becomes one int8 matrix, sheets x questions, straight from
+# the packed blobs. Every statistic is a column-wise NumPy reduction over
+# that matrix, summed into per-question accumulators aligned with the
+# collection's current questions, so a question keeps its history across
+# edits to the rest of the collection. Correctness is judged against the
+# current answer key: fixing a miskeyed question re-scores its past answers.
+# Answers to questions that have since been deleted are ignored.
+
+# Share of sheets in each of the upper and lower groups of the discrimination index
+GROUP_FRACTION = 0.27
+# Flags are only raised once a question has this many responses
+MIN_RESPONSES = 20
+EASY_P = 0.9
+HARD_P = 0.2
+LOW_DISCRIMINATION = 0.2
+
+def _sheet_groups(db: Session, collection_id: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(question ids, answer matrix) per layout."""
+    layouts = dict(db.execute(
+        select(models.AnswerLayout.id, models.AnswerLayout.question_ids)
+        .where(models.AnswerLayout.collection_id == collection_id)
+    ).all())
+    if not layouts:
+        return
+    rows = db.execute(
+        select(models.AnswerSheet.layout_id, models.AnswerSheet.answers)
+        .where(models.AnswerSheet.layout_id.in_(list(layouts)))
+        .order_by(models.AnswerSheet.layout_id)
+        .execution_options(yield_per=10000)
+    )
+    for layout_id, group in groupby(rows, key=lambda row: row[0]):
+        question_ids = np.frombuffer(layouts[layout_id], dtype="<i4")
+        answers = b"".join(row[1] for row in group)
+        yield question_ids, np.frombuffer(answers, dtype=np.int8).reshape(-1, len(question_ids))
+
+def _analyze(key: grading.AnswerKey, groups: Iterator[Tuple[np.ndarray, np.ndarray]]) -> dict:
+    n = len(key.question_ids)
+    position = {question_id: i for i, question_id in enumerate(key.question_ids)}
+    sheets = 0
+    responses = np.zeros(n, dtype=np.int64)
+    # Rows: unanswered, then options 0-3
+    choices = np.zeros((5, n), dtype=np.int64)
+    correct_count = np.zeros(n, dtype=np.int64)
+    upper_correct = np.zeros(n, dtype=np.int64)
+    lower_correct = np.zeros(n, dtype=np.int64)
+    group_size = np.zeros(n, dtype=np.int64)
+
+    for question_ids, matrix in groups:
+        columns = np.array([position.get(int(q), -1) for q in question_ids], dtype=np.int64)
+        present = columns >= 0
+        if not present.any():
+            continue
+        matrix = matrix[:, present]
+        columns = columns[present]
+        count = matrix.shape[0]
+        sheets += count
+        correct = matrix == key.key[columns]
+        responses[columns] += count
+        for row, value in enumerate(range(grading.UNANSWERED, 4)):
+            choices[row, columns] += (matrix == value).sum(axis=0)
+        correct_count[columns] += correct.sum(axis=0)
+        # Upper-lower index: share correct among the top scorers minus the
+        # bottom scorers, by score on the questions that still exist
+        size = min(max(1, round(count * GROUP_FRACTION)), count // 2)
+        if size:
+            order = np.argsort(correct.sum(axis=1), kind="stable")
+            lower_correct[columns] += correct[order[:size]].sum(axis=0)
+            upper_correct[columns] += correct[order[-size:]].sum(axis=0)
+            group_size[columns] += size
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_values = correct_count / responses
+        discrimination = (upper_correct - lower_correct) / group_size
+
+    questions = []
+    for i, question_id in enumerate(key.question_ids):
+        p = round(float(p_values[i]), 4) if responses[i] else None
+        d = round(float(discrimination[i]), 4) if group_size[i] else None
+        options = choices[1:, i].tolist()
+        flags = []
+        if key.key[i] == grading.NO_KEY:
+            flags.append("no_key")
+        if responses[i] >= MIN_RESPONSES:
+            if p >= EASY_P:
+                flags.append("too_easy")
+            elif p <= HARD_P:
+                flags.append("too_hard")
+            if d is not None and d < 0:
+                flags.append("negative_discrimination")
+            elif d is not None and d < LOW_DISCRIMINATION:
+                flags.append("low_discrimination")
+            if any(c == 0 for option, c in enumerate(options) if option != key.key[i]):
+                flags.append("unused_distractor")
+        questions.append({
+            "question_id": question_id,
+            "responses": int(responses[i]),
+            "unanswered": int(choices[0, i]),
+            "options": options,
+            "p_value": p,
+            "discrimination": d,
+            "flags": flags,
+        })
+    return {"responses": sheets, "questions": questions}
+
+def collection_stats(db: Session, collection_id: int) -> Optional[dict]:
+    """Item statistics for a collection, or None if it has no questions.
+
+    Cached until a question or a new submission changes the collection.
+    """
+    questions_version, _ = versions.get(("questions", collection_id))
+    answers_version, _ = versions.get(("answers", collection_id))
+    key = grading.answer_key(db, collection_id)
+    if not key.question_ids:
+        return None
+    stats = catalog.get_or_load(
+        ("item_stats", collection_id, questions_version, answers_version),
+        lambda: _analyze(key, _sheet_groups(db, collection_id)),
+    )
+    return {"collection_id": collection_id, **stats}
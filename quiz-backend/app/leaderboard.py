@@ -0,0 +1,219 @@
+from bisect import bisect_left, insort
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from . import models
+from .versions import versions
+from typing import Dict, Iterable, List, Optional, Tuple
+import datetime
+import threading
+
+WINDOWS = ("day", "week", "all")
+
+def period_of(window: str, timestamp: datetime.datetime) -> str:
+    if window == "day":
+        return timestamp.date().isoformat()
+    if window == "week":
+        year, week, _ = timestamp.isocalendar()
+        return f"{year}-W{week:02d}"
+    return "all"
+
+def percentage(score: int, total_questions: int) -> float:
+    return round(100.0 * score / total_questions, 2) if total_questions > 0 else 0.0
+
+class Board:
+    """Best result per user for one window period, kept in rank order.
+
+    ``_ranked`` holds (-percentage, achieved_at, username) tuples sorted
+    ascending, so rank is a bisect and top-N is a slice.
+    """
+
+    def __init__(self, period: str):
+        self.period = period
+        self._best: Dict[str, dict] = {}
+        self._ranked: List[Tuple[float, datetime.datetime, str]] = []
+
+    @staticmethod
+    def _key(entry: dict) -> Tuple[float, datetime.datetime, str]:
+        return (-entry["percentage"], entry["achieved_at"], entry["username"])
+
+    def offer(self, entry: dict) -> bool:
+        current = self._best.get(entry["username"])
+        if current is not None:
+            if self._key(entry) >= self._key(current):
+                return False
+            del self._ranked[bisect_left(self._ranked, self._key(current))]
+        self._best[entry["username"]] = entry
+        insort(self._ranked, self._key(entry))
+        return True
+
+    def top(self, limit: int) -> List[dict]:
+        return [
+            {"rank": rank, **self._best[username]}
+            for rank, (_, _, username) in enumerate(self._ranked[:limit], start=1)
+        ]
+
+    def rank(self, username: str) -> Optional[dict]:
+        entry = self._best.get(username)
+        if entry is None:
+            return None
+        return {"rank": bisect_left(self._ranked, self._key(entry)) + 1, **entry}
+
+    def __len__(self) -> int:
+        return len(self._best)
+
+class Leaderboard:
+    """In-memory leaderboards per window, fed incrementally from new results.
+
+    The best entry per (window, period, user) is also upserted into
+    ``leaderboard_entries`` in the same transaction as the result, so the
+    boards can be reloaded on restart without scanning ``results``.
+
+    With several workers each one only records its own results, so every
+    recorded batch also bumps the shared ("leaderboard",) version. A worker
+    that sees the version move by more than its own writes reloads its
+    boards from the table before answering.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._boards: Dict[str, Board] = {}
+        # ("leaderboard",) version the boards are known to reflect
+        self._seen: Optional[int] = None
+
+    def _board(self, window: str, now: datetime.datetime) -> Board:
+        period = period_of(window, now)
+        board = self._boards.get(window)
+        if board is None or board.period < period:
+            # The window rolled over; start an empty board for the new period
+            board = self._boards[window] = Board(period)
+        return board
+
+    @staticmethod
+    def _entries(rows: Iterable[dict]) -> Dict[Tuple[str, str, str], dict]:
+        best: Dict[Tuple[str, str, str], dict] = {}
+        for row in rows:
+            achieved_at = row["timestamp"]
+            entry = {
+                "username": row["username"],
+                "score": row["score"],
+                "total_questions": row["total_questions"],
+                "percentage": percentage(row["score"], row["total_questions"]),
+                "achieved_at": achieved_at,
+            }
+            for window in WINDOWS:
+                key = (window, period_of(window, achieved_at), row["username"])
+                current = best.get(key)
+                if current is None or Board._key(entry) < Board._key(current):
+                    best[key] = entry
+        return best
+
+    def persist(self, db: Session, rows: List[dict]) -> None:
+        """Upsert summary rows for ``rows``; the caller commits."""
+        entries = self._entries(rows)
+        if not entries:
+            return
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        table = models.LeaderboardEntry.__table__
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.window, table.c.period, table.c.username],
+            set_={
+                "score": stmt.excluded.score,
+                "total_questions": stmt.excluded.total_questions,
+                "percentage": stmt.excluded.percentage,
+                "achieved_at": stmt.excluded.achieved_at,
+            },
+            where=stmt.excluded.percentage > table.c.percentage,
+        )
+        db.execute(stmt, [
+            {"window": window, "period": period, **entry}
+            for (window, period, _), entry in entries.items()
+        ])
+
+    def record(self, rows: List[dict]) -> None:
+        """Apply committed results to the in-memory boards."""
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            for (window, period, _), entry in self._entries(rows).items():
+                board = self._board(window, now)
+                # Late rows from an already-closed period only live in the table
+                if board.period == period:
+                    board.offer(entry)
+        version = versions.bump(("leaderboard",))[0]
+        with self._lock:
+            # Anything in between was another worker's write; leave the boards stale
+            if self._seen is not None and version == self._seen + 1:
+                self._seen = version
+
+    def load(self, db: Session) -> None:
+        # Read first, so a write during the load leaves the boards marked stale
+        version, _ = versions.get(("leaderboard",))
+        if db.execute(select(models.LeaderboardEntry.id).limit(1)).first() is None:
+            self.rebuild(db)
+        now = datetime.datetime.utcnow()
+        boards = {window: Board(period_of(window, now)) for window in WINDOWS}
+        for window, board in boards.items():
+            stmt = select(models.LeaderboardEntry).where(
+                models.LeaderboardEntry.window == window,
+                models.LeaderboardEntry.period == board.period,
+            )
+            for row in db.execute(stmt).scalars():
+                board.offer({
+                    "username": row.username,
+                    "score": row.score,
+                    "total_questions": row.total_questions,
+                    "percentage": row.percentage,
+                    "achieved_at": row.achieved_at,
+                })
+        with self._lock:
+            self._boards = boards
+            self._seen = version
+
+    def _refresh(self) -> None:
+        if not versions.shared or versions.get(("leaderboard",))[0] == self._seen:
+            return
+        from .database import SessionLocal
+
+        with self._reload_lock:
+            if versions.get(("leaderboard",))[0] == self._seen:
+                return  # another thread reloaded while this one waited
+            db = SessionLocal()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+
+    def rebuild(self, db: Session, batch_size: int = 5000) -> None:
+        """Recompute the summary table from ``results`` (one streaming pass)."""
+        db.execute(delete(models.LeaderboardEntry))
+        stmt = select(
+            models.Result.username,
+            models.Result.score,
+            models.Result.total_questions,
+            models.Result.timestamp,
+        ).where(models.Result.timestamp.is_not(None)).execution_options(yield_per=batch_size)
+        for partition in db.execute(stmt).mappings().partitions():
+            self.persist(db, [dict(row) for row in partition])
+        db.commit()
+
+    def top(self, window: str, limit: int) -> Tuple[str, List[dict]]:
+        self._refresh()
+        with self._lock:
+            board = self._board(window, datetime.datetime.utcnow())
+            return board.period, board.top(limit)
+
+    def rank(self, window: str, username: str) -> Tuple[str, Optional[dict]]:
+        self._refresh()
+        with self._lock:
+            board = self._board(window, datetime.datetime.utcnow())
+            return board.period, board.rank(username)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {window: {"period": board.period, "users": len(board)} for window, board in self._boards.items()}
+
+leaderboard = Leaderboard()
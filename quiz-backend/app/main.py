@@ -1,14 +1,30 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine
+from fastapi.responses import PlainTextResponse
+from . import admission, compression, database, events, ingest, metrics, retention, snapshot
+from .cache import catalog
+from .database import DB_ASYNC, SessionLocal, engine, pool_status
+from .leaderboard import leaderboard as leaderboard_engine
+from .migrations import run_migrations
 from .models import Base
-from .routers import categories, quizzes, results
+from .routers import categories, quizzes, results, leaderboard, imports, grading, search, quiz_sessions, reports
+from .routers import events as events_router
 import os
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+metrics.instrument(engine)
+if database.async_engine is not None:
+    metrics.instrument(database.async_engine.sync_engine)
 
 app = FastAPI()
 
+# Added first so it sits inside the snapshot (whose hits need no slot), CORS
+# and metrics (which count shed requests)
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(snapshot.SnapshotMiddleware)
+
 # CORS setup
 app.add_middleware(
     CORSMiddleware,
@@ -16,14 +32,123 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Routers
-app.include_router(categories.router)
-app.include_router(quizzes.router)
-app.include_router(results.router) 
+if DB_ASYNC:
+    from .routers import async_categories, async_quizzes, async_results
+    app.include_router(async_categories.router)
+    app.include_router(async_quizzes.router)
+    app.include_router(async_results.router)
+else:
+    app.include_router(categories.router)
+    app.include_router(quizzes.router)
+    app.include_router(results.router)
+app.include_router(leaderboard.router)
+app.include_router(imports.router)
+app.include_router(grading.router)
+app.include_router(search.router)
+app.include_router(quiz_sessions.router)
+app.include_router(reports.router)
+app.include_router(events_router.router)
+
+@app.on_event("startup")
+def load_leaderboards():
+    db = SessionLocal()
+    try:
+        leaderboard_engine.load(db)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def start_result_batcher():
+    if ingest.results_batcher is not None:
+        ingest.results_batcher.start()
+
+@app.on_event("startup")
+def start_retention():
+    if retention.retention_worker is not None:
+        retention.retention_worker.start()
+
+@app.on_event("startup")
+def start_catalog_snapshot():
+    # Builds the snapshot if no worker has one for this boot and generation yet
+    if snapshot.catalog_snapshot is not None:
+        snapshot.catalog_snapshot.schedule_rebuild()
+
+@app.on_event("shutdown")
+def flush_result_batcher():
+    if ingest.results_batcher is not None:
+        ingest.results_batcher.stop()
+
+@app.on_event("shutdown")
+def stop_retention():
+    if retention.retention_worker is not None:
+        retention.retention_worker.stop()
+
+@app.on_event("shutdown")
+def close_event_streams():
+    # Ends streams still open when shutdown reaches the app (uvicorn first
+    # waits for connections, up to its graceful-shutdown timeout)
+    events.broker.close()
+
+@app.get("/ingest/stats")
+def ingest_stats():
+    if ingest.results_batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **ingest.results_batcher.stats()}
+
+@app.get("/admission/stats")
+def admission_stats():
+    if admission.admission_controller is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.admission_controller.stats()}
+
+@app.get("/retention/stats")
+def retention_stats():
+    db = SessionLocal()
+    try:
+        last_run = retention.last_run(db)
+    finally:
+        db.close()
+    if retention.retention_worker is None:
+        return {"enabled": False, "last_run": last_run}
+    return {"enabled": True, **retention.retention_worker.stats(), "last_run": last_run}
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = {"catalog": catalog.stats()}
+    if compression.body_cache is not None:
+        stats["bodies"] = compression.body_cache.stats()
+    if snapshot.catalog_snapshot is not None:
+        stats["snapshot"] = snapshot.catalog_snapshot.stats()
+    return stats
+
+@app.get("/db/pool")
+def db_pool():
+    return pool_status()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slow-queries")
+def slow_queries(limit: int = Query(50, ge=1, le=500)):
+    if metrics.slow_query_log is None:
+        return {"enabled": False}
+    return {"enabled": True, "threshold_ms": metrics.SLOW_QUERY_MS, "queries": metrics.slow_query_log.top(limit)}
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port) 
\ No newline at end of file
+    workers = int(os.environ.get("WORKERS", 1))
+    if workers > 1 and not snapshot.SNAPSHOT_DIR:
+        # Versions, caches and leaderboards are only kept coherent through it
+        raise SystemExit("WORKERS > 1 requires CATALOG_SNAPSHOT_DIR (shared by all workers)")
+    # SSE and WebSocket streams never finish on their own
+    shutdown_timeout = int(os.environ.get("SHUTDOWN_TIMEOUT", 10))
+    uvicorn.run(
+        "app.main:app", host="0.0.0.0", port=port, workers=workers, timeout_graceful_shutdown=shutdown_timeout
+    )
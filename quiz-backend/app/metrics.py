@@ -0,0 +1,306 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Dict, Iterable, List, Optional, Tuple
+import bisect
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+# Request and SQL instrumentation, exported in the Prometheus text format.
+#
+# Engine events count and time every statement. While a request is being
+# served the totals also go to a per-request RequestStats that the
+# middleware set in a contextvar, so SQL cost is attributed to the route.
+# Sync routes run in a threadpool with a copy of that context, async routes
+# on the event loop, and both see the same object.
+
+slow_logger = logging.getLogger("app.sql.slow")
+
+# Statements slower than this are logged with their fingerprint; unset = off
+SLOW_QUERY_MS = float(os.environ["SLOW_QUERY_MS"]) if os.environ.get("SLOW_QUERY_MS") else None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple."""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # bucket counts (+Inf last), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, name: str, help: str, label_names: Tuple[str, ...]) -> List[str]:
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(label_names + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{name}_sum{base} {total}")
+            lines.append(f"{name}_count{base} {count}")
+        return lines
+
+class Counter:
+    def __init__(self):
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def items(self) -> List[Tuple[tuple, float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _metric(name: str, kind: str, help: str, samples: Iterable[Tuple[tuple, float]], label_names: Tuple[str, ...] = ()) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(label_names, labels)} {value}" for labels, value in samples)
+    return lines
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_current_path: ContextVar[str] = ContextVar("current_path", default="")
+
+statement_duration = Histogram(LATENCY_BUCKETS)
+slow_queries_total = Counter()
+
+_PARAMS = re.compile(r"%\(\w+\)s|(?<!:):\w+|\$\d+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> str:
+    """Statement with literals, parameters and IN/VALUES lists collapsed."""
+    text = _PARAMS.sub("?", statement)
+    text = _LITERALS.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _VALUE_LISTS.sub("(?+)", text)
+
+class SlowQueryLog:
+    """Aggregates slow statements by fingerprint and logs each occurrence."""
+
+    def __init__(self, threshold_ms: float, max_fingerprints: int = 500):
+        self.threshold = threshold_ms / 1000
+        self.max_fingerprints = max_fingerprints
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float) -> None:
+        text = fingerprint(statement)
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        path = _current_path.get() or "-"
+        slow_queries_total.inc()
+        slow_logger.warning("slow query %.1f ms path=%s fingerprint=%s %s", seconds * 1000, path, digest, text)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    return
+                entry = self._entries[digest] = {
+                    "fingerprint": digest, "statement": text, "count": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "paths": [],
+                }
+            entry["count"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+            # A few example request paths; background writers show up as "-"
+            if path not in entry["paths"] and len(entry["paths"]) < 5:
+                entry["paths"].append(path)
+
+    def top(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e["total_ms"], reverse=True)[:limit]
+            return [{**e, "total_ms": round(e["total_ms"], 3), "max_ms": round(e["max_ms"], 3), "paths": list(e["paths"])} for e in entries]
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS) if SLOW_QUERY_MS is not None else None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    statement_duration.observe((), elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+    if slow_query_log is not None and elapsed >= slow_query_log.threshold:
+        slow_query_log.record(statement, elapsed)
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def instrument(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+request_duration = Histogram(LATENCY_BUCKETS)
+request_queries = Histogram(QUERY_COUNT_BUCKETS)
+request_query_seconds = Counter()
+requests_total = Counter()
+# Scopes of the requests being served. The route is only known once routing
+# has run inside the app, so the in-flight gauge reads it at scrape time.
+_active: Dict[int, dict] = {}
+# Every (method, route) seen in flight, so idle routes report 0 rather than vanish
+in_flight: Dict[Tuple[str, str], int] = {}
+_in_flight_lock = threading.Lock()
+
+def _route_of(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so 404 scans cannot blow up cardinality
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Per-route latency, status and SQL histograms plus in-flight gauges."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        stats = RequestStats()
+        stats_token = _request_stats.set(stats)
+        path_token = _current_path.set(scope["path"])
+        status = 500
+        started = time.perf_counter()
+        with _in_flight_lock:
+            _active[id(scope)] = scope
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            with _in_flight_lock:
+                del _active[id(scope)]
+            _request_stats.reset(stats_token)
+            _current_path.reset(path_token)
+            route = _route_of(scope)
+            request_duration.observe((method, route), elapsed)
+            request_queries.observe((method, route), stats.queries)
+            request_query_seconds.inc((method, route), stats.query_seconds)
+            requests_total.inc((method, route, str(status)))
+
+def _collector_lines() -> List[str]:
+    from . import admission, compression, events, ingest, retention, snapshot
+    from .cache import catalog
+    from .database import pool_status
+
+    lines: List[str] = []
+    cache = catalog.stats()
+    lines += _metric("catalog_cache_entries", "gauge", "Entries in the catalog cache", [((), cache["size"])])
+    for name in ("hits", "misses", "evictions", "invalidations"):
+        lines += _metric(f"catalog_cache_{name}_total", "counter", f"Catalog cache {name}", [((), cache[name])])
+
+    if compression.body_cache is not None:
+        bodies = compression.body_cache.stats()
+        lines += _metric("response_cache_bytes", "gauge", "Bytes of cached response bodies", [((), bodies["bytes"])])
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            lines += _metric(f"response_cache_{name}_total", "counter", f"Response body cache {name}", [((), bodies[name])])
+
+    broker = events.broker.stats()
+    lines += _metric("events_subscribers", "gauge", "Open SSE/WebSocket subscriptions", [((), broker["subscribers"])])
+    for name in ("published", "delivered", "coalesced", "dropped"):
+        lines += _metric(f"events_{name}_total", "counter", f"Live events {name}", [((), broker[name])])
+
+    if ingest.results_batcher is not None:
+        queue = ingest.results_batcher.stats()
+        lines += _metric("result_queue_pending", "gauge", "Results waiting in the write-behind queue", [((), queue["pending"])])
+        for name in ("accepted", "rejected", "written", "batches", "failed"):
+            lines += _metric(f"result_queue_{name}_total", "counter", f"Write-behind queue {name}", [((), queue[name])])
+
+    if admission.admission_controller is not None:
+        pools = admission.admission_controller.stats()["pools"]
+        for name, help in (("active", "Requests admitted and in progress"), ("waiting", "Requests queued for a slot")):
+            lines += _metric(f"admission_{name}", "gauge", help, [((pool,), s[name]) for pool, s in pools.items()], ("pool",))
+        for name in ("admitted", "queued", "rejected", "timed_out"):
+            lines += _metric(f"admission_{name}_total", "counter", f"Requests {name.replace('_', ' ')} by admission control",
+                             [((pool,), s[name]) for pool, s in pools.items()], ("pool",))
+
+    if retention.retention_worker is not None:
+        worker = retention.retention_worker.stats()
+        for name in ("runs", "skipped", "failed", "archived"):
+            lines += _metric(f"results_retention_{name}_total", "counter", f"Results retention {name}", [((), worker[name])])
+
+    if snapshot.catalog_snapshot is not None:
+        shared = snapshot.catalog_snapshot.stats()
+        lines += _metric("catalog_snapshot_generation", "gauge", "Shared catalog generation", [((), shared["generation"])])
+        lines += _metric("catalog_snapshot_bytes", "gauge", "Size of the mapped catalog snapshot", [((), shared["bytes"])])
+        for name in ("hits", "misses", "builds"):
+            lines += _metric(f"catalog_snapshot_{name}_total", "counter", f"Catalog snapshot {name}", [((), shared[name])])
+
+    pools = pool_status()
+    for name, help in (("size", "Configured pool size"), ("checkedout", "Connections in use"),
+                       ("checkedin", "Idle connections"), ("overflow", "Overflow connections")):
+        samples = [((engine,), stats[name]) for engine, stats in pools.items() if name in stats]
+        if samples:
+            lines += _metric(f"db_pool_{name}", "gauge", help, samples, ("engine",))
+    return lines
+
+def render() -> str:
+    lines: List[str] = []
+    with _in_flight_lock:
+        for labels in in_flight:
+            in_flight[labels] = 0
+        for scope in _active.values():
+            labels = (scope["method"], _route_of(scope))
+            in_flight[labels] = in_flight.get(labels, 0) + 1
+        flight = sorted(in_flight.items())
+    lines += _metric("http_requests_in_flight", "gauge", "Requests currently being served", flight, ("method", "route"))
+    lines += _metric("http_requests_total", "counter", "Requests served", requests_total.items(), ("method", "route", "status"))
+    lines += request_duration.render("http_request_duration_seconds", "Request latency", ("method", "route"))
+    lines += request_queries.render("http_request_db_queries", "SQL statements per request", ("method", "route"))
+    lines += _metric("http_request_db_seconds_total", "counter", "Time spent in SQL per route",
+                     request_query_seconds.items(), ("method", "route"))
+    lines += statement_duration.render("db_statement_duration_seconds", "SQL statement latency", ())
+    lines += _metric("db_slow_queries_total", "counter", "Statements over SLOW_QUERY_MS",
+                     [((), dict(slow_queries_total.items()).get((), 0))])
+    lines += _collector_lines()
+    return "\n".join(lines) + "\n"
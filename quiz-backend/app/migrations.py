@@ -0,0 +1,150 @@
+from sqlalchemy import MetaData, Table, func, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+from . import search
+from .models import Base, Result
+from typing import List
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# create_all() only creates missing tables, so anything added to an existing
+# table later (indexes, constraints) is brought up to date here.
+
+def ensure_indexes(engine: Engine) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def _tables_missing_cascades(engine: Engine) -> List[Table]:
+    """Tables whose model declares ON DELETE CASCADE but the database does not."""
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    stale = []
+    for table in Base.metadata.sorted_tables:
+        wanted = {fk.column.table.name for fk in table.foreign_keys if fk.ondelete == "CASCADE"}
+        if not wanted or table.name not in existing:
+            continue
+        for reflected in inspector.get_foreign_keys(table.name):
+            ondelete = (reflected.get("options") or {}).get("ondelete") or ""
+            if reflected["referred_table"] in wanted and ondelete.upper() != "CASCADE":
+                stale.append(table)
+                break
+    return stale
+
+def _rebuild_sqlite_tables(engine: Engine, tables: List[Table]) -> None:
+    # SQLite cannot alter a constraint, so each table is recreated with the new
+    # definition, its rows copied and the old one dropped, following
+    # https://www.sqlite.org/lang_altertable.html#otheralter. Indexes and the
+    # FTS triggers go with the old table; ensure_indexes() and
+    # search.ensure_index() put them back.
+    scratch = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(scratch)
+    raw = engine.raw_connection()
+    try:
+        conn = raw.driver_connection
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None  # explicit BEGIN/COMMIT below
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=OFF")
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for table in tables:
+                # Rows whose parent is already gone would fail the new
+                # constraint; with CASCADE they would have gone with it
+                for fk in table.foreign_keys:
+                    orphans = cursor.execute(
+                        f"DELETE FROM {table.name} WHERE {fk.parent.name} NOT IN "
+                        f"(SELECT {fk.column.name} FROM {fk.column.table.name})"
+                    ).rowcount
+                    if orphans:
+                        logger.warning("removed %d orphaned rows from %s", orphans, table.name)
+            for table in tables:
+                rebuilt = scratch.tables[table.name].to_metadata(scratch, name=f"{table.name}__rebuild")
+                cursor.execute(str(CreateTable(rebuilt).compile(dialect=engine.dialect)))
+                present = {row[1] for row in cursor.execute(f"PRAGMA table_info({table.name})")}
+                columns = ", ".join(c.name for c in table.columns if c.name in present)
+                cursor.execute(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}")
+                cursor.execute(f"DROP TABLE {table.name}")
+                cursor.execute(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}")
+            violations = cursor.execute("PRAGMA foreign_key_check").fetchall()
+            if violations:
+                raise RuntimeError(f"foreign key violations after rebuild: {violations[:5]}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.execute("PRAGMA foreign_keys=ON")
+            conn.isolation_level = isolation_level
+    finally:
+        raw.close()
+
+def _replace_constraints(engine: Engine, tables: List[Table]) -> None:
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in tables:
+            for fk in inspector.get_foreign_keys(table.name):
+                if ((fk.get("options") or {}).get("ondelete") or "").upper() == "CASCADE":
+                    continue
+                columns = ", ".join(fk["constrained_columns"])
+                referred = ", ".join(fk["referred_columns"])
+                conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{fk["name"]}"'))
+                conn.execute(text(
+                    f'ALTER TABLE {table.name} ADD CONSTRAINT "{fk["name"]}" FOREIGN KEY ({columns}) '
+                    f'REFERENCES {fk["referred_table"]} ({referred}) ON DELETE CASCADE'
+                ))
+
+def ensure_cascading_foreign_keys(engine: Engine) -> None:
+    tables = _tables_missing_cascades(engine)
+    if not tables:
+        return
+    logger.info("adding ON DELETE CASCADE to %s", ", ".join(t.name for t in tables))
+    if engine.dialect.name == "sqlite":
+        _rebuild_sqlite_tables(engine, tables)
+    else:
+        _replace_constraints(engine, tables)
+
+def backfill_result_timestamps(engine: Engine) -> None:
+    # The column used to be nullable; rows without a timestamp get the oldest
+    # known one so they page (and are archived) with the oldest results
+    table = Result.__table__
+    with engine.begin() as conn:
+        if conn.execute(select(table.c.id).where(table.c.timestamp.is_(None)).limit(1)).first() is None:
+            return
+        oldest = conn.execute(select(func.min(table.c.timestamp))).scalar() or datetime.datetime.utcnow()
+        filled = conn.execute(update(table).where(table.c.timestamp.is_(None)).values(timestamp=oldest)).rowcount
+    logger.warning("gave %d results without a timestamp the oldest one, %s", filled, oldest)
+
+# Columns made NOT NULL after databases already existed
+NOT_NULL_COLUMNS = (("results", "timestamp"),)
+
+def ensure_not_null_columns(engine: Engine) -> None:
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    stale = {}
+    for table_name, column_name in NOT_NULL_COLUMNS:
+        if table_name not in existing:
+            continue
+        column = next(c for c in inspector.get_columns(table_name) if c["name"] == column_name)
+        if column["nullable"]:
+            stale.setdefault(table_name, []).append(column_name)
+    if not stale:
+        return
+    logger.info("adding NOT NULL to %s", ", ".join(f"{t}.{c}" for t, cs in stale.items() for c in cs))
+    if engine.dialect.name == "sqlite":
+        _rebuild_sqlite_tables(engine, [Base.metadata.tables[name] for name in stale])
+    else:
+        with engine.begin() as conn:
+            for table_name, columns in stale.items():
+                for column_name in columns:
+                    conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL"))
+
+def run_migrations(engine: Engine) -> None:
+    ensure_cascading_foreign_keys(engine)
+    backfill_result_timestamps(engine)
+    ensure_not_null_columns(engine)
+    ensure_indexes(engine)
+    search.ensure_index(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Index, LargeBinary, Text, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 import datetime
 
@@ -8,7 +8,8 @@ class Category(Base):
     __tablename__ = 'categories'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
-    quiz_collections = relationship('QuizCollection', back_populates='category', cascade='all, delete')
+    # Children are removed by ON DELETE CASCADE in the database, not loaded and deleted one by one
+    quiz_collections = relationship('QuizCollection', back_populates='category', cascade='all, delete', passive_deletes=True)
 
 class QuizCollection(Base):
     __tablename__ = 'quiz_collections'
@@ -16,10 +17,10 @@ class QuizCollection(Base):
     title = Column(String, nullable=False)
     description = Column(String, nullable=False)
     difficulty = Column(String, nullable=False, default="Medium")
-    category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
+    category_id = Column(Integer, ForeignKey('categories.id', ondelete='CASCADE'), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     category = relationship('Category', back_populates='quiz_collections')
-    questions = relationship('Quiz', back_populates='collection', cascade='all, delete')
+    questions = relationship('Quiz', back_populates='collection', cascade='all, delete', passive_deletes=True)
 
 class Quiz(Base):
     __tablename__ = 'quizzes'
@@ -30,7 +31,7 @@ class Quiz(Base):
     option3 = Column(String, nullable=False)
     option4 = Column(String, nullable=False)
     correct_answer = Column(String, nullable=False)
-    collection_id = Column(Integer, ForeignKey('quiz_collections.id'), nullable=False)
+    collection_id = Column(Integer, ForeignKey('quiz_collections.id', ondelete='CASCADE'), nullable=False, index=True)
     collection = relationship('QuizCollection', back_populates='questions')
 
 class Result(Base):
@@ -39,4 +40,91 @@ class Result(Base):
     username = Column(String, nullable=False)
     score = Column(Integer, nullable=False)
     total_questions = Column(Integer, nullable=False)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow) 
\ No newline at end of file
+    timestamp = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    # Back keyset pagination on (timestamp, id), overall and per user
+    __table_args__ = (
+        Index('ix_results_timestamp_id', 'timestamp', 'id'),
+        Index('ix_results_username_timestamp_id', 'username', 'timestamp', 'id'),
+    )
+
+class ResultDailyRollup(Base):
+    # Totals of the results archived by retention, per UTC day; reports add
+    # the rows still in results on top
+    __tablename__ = 'result_daily_rollups'
+    day = Column(Date, primary_key=True)
+    results = Column(Integer, nullable=False)
+    score_sum = Column(Integer, nullable=False)
+    total_questions_sum = Column(Integer, nullable=False)
+    percentage_sum = Column(Float, nullable=False)
+    perfect_scores = Column(Integer, nullable=False)
+
+class ResultUserRollup(Base):
+    # Totals of the results archived by retention, per user
+    __tablename__ = 'result_user_rollups'
+    username = Column(String, primary_key=True)
+    results = Column(Integer, nullable=False)
+    score_sum = Column(Integer, nullable=False)
+    total_questions_sum = Column(Integer, nullable=False)
+    percentage_sum = Column(Float, nullable=False)
+    best_percentage = Column(Float, nullable=False)
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+
+class RetentionRun(Base):
+    __tablename__ = 'retention_runs'
+    id = Column(Integer, primary_key=True)
+    cutoff = Column(DateTime, nullable=False)  # results older than this were archived
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    archived = Column(Integer, nullable=False)
+    batches = Column(Integer, nullable=False)
+
+class LeaderboardEntry(Base):
+    # Materialized best result per user for each leaderboard window period
+    __tablename__ = 'leaderboard_entries'
+    id = Column(Integer, primary_key=True)
+    window = Column(String, nullable=False)  # day | week | all
+    period = Column(String, nullable=False)  # e.g. 2024-05-01, 2024-W18, all
+    username = Column(String, nullable=False)
+    score = Column(Integer, nullable=False)
+    total_questions = Column(Integer, nullable=False)
+    percentage = Column(Float, nullable=False)
+    achieved_at = Column(DateTime, nullable=False)
+    __table_args__ = (
+        UniqueConstraint('window', 'period', 'username', name='uq_leaderboard_window_period_user'),
+    ) 
+
+class QuizSession(Base):
+    # A randomly drawn set of questions, stored so the submission can be graded
+    # against exactly what was served
+    __tablename__ = 'quiz_sessions'
+    id = Column(String(32), primary_key=True)
+    category_id = Column(Integer, nullable=False, index=True)
+    difficulty = Column(String, nullable=True)
+    seed = Column(Integer, nullable=False)
+    question_ids = Column(Text, nullable=False)  # comma-separated, in served order
+    answer_key = Column(String, nullable=False)  # correct option index per question, "x" = none
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    username = Column(String, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    result_id = Column(Integer, nullable=True)
+
+class AnswerLayout(Base):
+    # The question set a collection's submissions were graded against; each
+    # distinct set is stored once and shared by all its answer sheets
+    __tablename__ = 'answer_layouts'
+    id = Column(Integer, primary_key=True)
+    collection_id = Column(Integer, ForeignKey('quiz_collections.id', ondelete='CASCADE'), nullable=False, index=True)
+    question_ids = Column(LargeBinary, nullable=False)  # little-endian int32 per question, in question-id order
+    __table_args__ = (
+        UniqueConstraint('collection_id', 'question_ids', name='uq_answer_layout_collection_questions'),
+    )
+
+class AnswerSheet(Base):
+    # Chosen option per question for one graded submission, packed as int8
+    # (-1 = unanswered) in the layout's question order
+    __tablename__ = 'answer_sheets'
+    id = Column(Integer, primary_key=True)
+    layout_id = Column(Integer, ForeignKey('answer_layouts.id', ondelete='CASCADE'), nullable=False, index=True)
+    result_id = Column(Integer, ForeignKey('results.id', ondelete='CASCADE'), nullable=False, index=True)
+    answers = Column(LargeBinary, nullable=False)
@@ -0,0 +1,145 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from . import crud, grading, models
+from .cache import catalog
+from .versions import versions
+from typing import Dict, List, Optional, Tuple
+import datetime
+import numpy as np
+import random
+import secrets
+import uuid
+
+# Random quiz sessions: "N random questions from category X (and difficulty Y)".
+#
+# Instead of ORDER BY RANDOM() over the whole quizzes table, each
+# (category, difficulty) pool is loaded once as a sorted tuple of
+# (question_id, collection_id) pairs and cached. A draw is then
+# random.Random(seed).sample() over that tuple, which uses set-based rejection
+# sampling for small draws, so it costs O(count) rather than O(pool).
+# The pool is keyed by the category's collections version, which every
+# question insert/delete and collection change bumps.
+
+NO_KEY_CHAR = "x"
+
+class NotEnoughQuestions(ValueError):
+    pass
+
+class SessionClosed(ValueError):
+    pass
+
+def _pool(db: Session, category_id: int, difficulty: Optional[str]) -> Tuple[Tuple[int, int], ...]:
+    stmt = (
+        select(models.Quiz.id, models.Quiz.collection_id)
+        .join(models.QuizCollection, models.Quiz.collection_id == models.QuizCollection.id)
+        .where(models.QuizCollection.category_id == category_id)
+        .order_by(models.Quiz.id)
+    )
+    if difficulty is not None:
+        stmt = stmt.where(models.QuizCollection.difficulty == difficulty)
+    return tuple((row.id, row.collection_id) for row in db.execute(stmt))
+
+def question_pool(db: Session, category_id: int, difficulty: Optional[str] = None) -> Tuple[Tuple[int, int], ...]:
+    version, _ = versions.get(("collections", category_id))
+    return catalog.get_or_load(
+        ("session_pool", category_id, difficulty, version),
+        lambda: _pool(db, category_id, difficulty),
+    )
+
+def _key_char(quiz: models.Quiz) -> str:
+    options = [quiz.option1, quiz.option2, quiz.option3, quiz.option4]
+    return str(options.index(quiz.correct_answer)) if quiz.correct_answer in options else NO_KEY_CHAR
+
+def create_session(
+    db: Session, category_id: int, difficulty: Optional[str], count: int, seed: Optional[int] = None
+) -> Tuple[models.QuizSession, List[models.Quiz]]:
+    pool = question_pool(db, category_id, difficulty)
+    if len(pool) < count:
+        raise NotEnoughQuestions(f"only {len(pool)} questions match, {count} requested")
+    if seed is None:
+        seed = secrets.randbelow(2**31)
+    drawn = random.Random(seed).sample(pool, count)
+
+    # Question bodies come from the per-collection cache
+    by_collection: Dict[int, Dict[int, models.Quiz]] = {}
+    for _, collection_id in drawn:
+        if collection_id not in by_collection:
+            by_collection[collection_id] = {q.id: q for q in crud.get_quizzes_by_collection(db, collection_id)}
+    questions = [by_collection[collection_id].get(quiz_id) for quiz_id, collection_id in drawn]
+    if None in questions:
+        # A write landed between loading the pool and the collections; read the drawn ids directly
+        found = _questions_by_id(db, [quiz_id for quiz_id, _ in drawn])
+        if len(found) < count:
+            raise NotEnoughQuestions("the question pool changed while drawing; try again")
+        questions = [found[quiz_id] for quiz_id, _ in drawn]
+
+    session = models.QuizSession(
+        id=uuid.uuid4().hex,
+        category_id=category_id,
+        difficulty=difficulty,
+        seed=seed,
+        question_ids=",".join(str(q.id) for q in questions),
+        answer_key="".join(_key_char(q) for q in questions),
+        created_at=datetime.datetime.utcnow(),
+    )
+    db.add(session)
+    db.commit()
+    return session, questions
+
+def question_ids(session: models.QuizSession) -> List[int]:
+    return [int(i) for i in session.question_ids.split(",")]
+
+def _questions_by_id(db: Session, ids: List[int]) -> Dict[int, models.Quiz]:
+    return {q.id: q for q in db.execute(select(models.Quiz).where(models.Quiz.id.in_(ids))).scalars()}
+
+def get_session(db: Session, session_id: str) -> Optional[Tuple[models.QuizSession, List[models.Quiz]]]:
+    session = db.get(models.QuizSession, session_id)
+    if session is None:
+        return None
+    ids = question_ids(session)
+    found = _questions_by_id(db, ids)
+    # Questions deleted since the draw are left out; grading still uses the stored key
+    return session, [found[i] for i in ids if i in found]
+
+def answer_key(session: models.QuizSession) -> grading.AnswerKey:
+    key = np.array(
+        [grading.NO_KEY if c == NO_KEY_CHAR else int(c) for c in session.answer_key], dtype=np.int8
+    )
+    return grading.AnswerKey(tuple(question_ids(session)), key)
+
+def submit(db: Session, session_id: str, username: str, answers: List[Optional[int]]) -> Optional[dict]:
+    """Grade a session's one submission against the key stored when it was drawn."""
+    session = db.get(models.QuizSession, session_id)
+    if session is None:
+        return None
+    key = answer_key(session)
+    scores, correct = grading.grade(key, [answers])
+    now = datetime.datetime.utcnow()
+    # Claim the session, record the result and link it in one transaction,
+    # so a second concurrent submission cannot also be recorded and a failure
+    # leaves neither behind
+    claimed = db.execute(
+        update(models.QuizSession)
+        .where(models.QuizSession.id == session_id, models.QuizSession.completed_at.is_(None))
+        .values(completed_at=now, username=username)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        raise SessionClosed("this session has already been submitted")
+    total_questions = len(key.question_ids)
+    rows = grading.grade_rows([username], scores, total_questions, now)
+    try:
+        result_id = crud.insert_results(db, rows)[0]
+        db.execute(update(models.QuizSession).where(models.QuizSession.id == session_id).values(result_id=result_id))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    crud._results_recorded(rows, [result_id])
+    return {
+        "result_id": result_id,
+        "username": username,
+        "score": rows[0]["score"],
+        "total_questions": total_questions,
+        "correct": correct[0].tolist(),
+    }
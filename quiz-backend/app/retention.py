@@ -0,0 +1,418 @@
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+from . import models
+from .database import SessionLocal, engine
+from .fastjson import dumps
+from .versions import versions
+from typing import Dict, List, Optional, Tuple
+import argparse
+import datetime
+import gzip
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Retention for the results table.
+#
+# Results older than a cutoff are moved out in batches. Each batch is
+# appended to a gzipped JSONL file per UTC day under
+# ARCHIVE_DIR/results/year=YYYY/month=MM/, then added to the daily and
+# per-user rollup tables and deleted from results in one short transaction,
+# so a row is always counted exactly once: either in a rollup or as a raw
+# row. The reports below add the two together. A crash between the archive
+# write and the commit repeats that batch in the archive on the next run;
+# records carry the result id, so duplicates can be dropped by id.
+#
+# Deleting a result also deletes its answer sheet (ON DELETE CASCADE); the
+# sheet is archived with it and item statistics then cover retained results
+# only. Leaderboards are kept in leaderboard_entries and are not affected.
+
+# Results older than this many days are archived by the background worker; 0 = off
+RETENTION_DAYS = int(os.environ.get("RESULTS_RETENTION_DAYS", 0))
+ARCHIVE_DIR = os.environ.get("RESULTS_ARCHIVE_DIR", "archive")
+BATCH_SIZE = int(os.environ.get("RESULTS_RETENTION_BATCH", 2000))
+# Pause between batches so request writers get the write lock in between
+BATCH_PAUSE = float(os.environ.get("RESULTS_RETENTION_PAUSE", 0.05))
+INTERVAL = float(os.environ.get("RESULTS_RETENTION_INTERVAL", 3600))
+GZIP_LEVEL = 6
+
+DAILY_SUMS = ("results", "score_sum", "total_questions_sum", "percentage_sum", "perfect_scores")
+USER_SUMS = ("results", "score_sum", "total_questions_sum", "percentage_sum")
+
+def cutoff_for(days: int, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """Start of the UTC day ``days`` days ago, so days are archived whole."""
+    now = now or datetime.datetime.utcnow()
+    return datetime.datetime.combine(now.date() - datetime.timedelta(days=days), datetime.time.min)
+
+def partition_path(archive_dir: str, day: datetime.date) -> str:
+    return os.path.join(
+        archive_dir, "results", f"year={day.year:04d}", f"month={day.month:02d}", f"results-{day.isoformat()}.jsonl.gz"
+    )
+
+def _percentage(score: int, total_questions: int) -> float:
+    return 100.0 * score / total_questions if total_questions > 0 else 0.0
+
+# The same, per row in SQL, for the rows still in results
+_PERCENTAGE = case(
+    (models.Result.total_questions > 0, 100.0 * models.Result.score / models.Result.total_questions), else_=0.0
+)
+_PERFECT = case(
+    ((models.Result.total_questions > 0) & (models.Result.score == models.Result.total_questions), 1), else_=0
+)
+
+def _read_batch(db: Session, cutoff: datetime.datetime, limit: int) -> Tuple[list, dict]:
+    # Oldest first along ix_results_timestamp_id; processed rows are deleted,
+    # so every batch starts from the front again
+    rows = db.execute(
+        select(
+            models.Result.id, models.Result.username, models.Result.score,
+            models.Result.total_questions, models.Result.timestamp,
+        )
+        .where(models.Result.timestamp < cutoff)
+        .order_by(models.Result.timestamp, models.Result.id)
+        .limit(limit)
+    ).all()
+    sheets = {}
+    if rows:
+        stmt = (
+            select(
+                models.AnswerSheet.result_id, models.AnswerSheet.answers,
+                models.AnswerLayout.collection_id, models.AnswerLayout.question_ids,
+            )
+            .join(models.AnswerLayout, models.AnswerSheet.layout_id == models.AnswerLayout.id)
+            .where(models.AnswerSheet.result_id.in_([row.id for row in rows]))
+        )
+        sheets = {sheet.result_id: sheet for sheet in db.execute(stmt)}
+    return rows, sheets
+
+def _record(row, sheet) -> bytes:
+    record = {
+        "id": row.id,
+        "username": row.username,
+        "score": row.score,
+        "total_questions": row.total_questions,
+        "timestamp": row.timestamp,
+    }
+    if sheet is not None:
+        record["answer_sheet"] = {
+            "collection_id": sheet.collection_id,
+            "question_ids": np.frombuffer(sheet.question_ids, dtype="<i4").tolist(),
+            "answers": np.frombuffer(sheet.answers, dtype=np.int8).tolist(),
+        }
+    return dumps(record) + b"\n"
+
+def _archive(archive_dir: str, rows: list, sheets: dict) -> None:
+    by_day: Dict[datetime.date, List[bytes]] = {}
+    for row in rows:
+        by_day.setdefault(row.timestamp.date(), []).append(_record(row, sheets.get(row.id)))
+    for day, lines in by_day.items():
+        path = partition_path(archive_dir, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Each batch is appended as its own gzip member; gzip readers (zcat,
+        # gzip.open, pandas) read concatenated members as one stream
+        with open(path, "ab") as f:
+            f.write(gzip.compress(b"".join(lines), compresslevel=GZIP_LEVEL, mtime=0))
+            f.flush()
+            os.fsync(f.fileno())
+
+def _rollups(rows: list) -> Tuple[dict, dict]:
+    days: Dict[datetime.date, dict] = {}
+    users: Dict[str, dict] = {}
+    for row in rows:
+        percentage = _percentage(row.score, row.total_questions)
+        day = days.setdefault(row.timestamp.date(), dict.fromkeys(DAILY_SUMS, 0))
+        day["results"] += 1
+        day["score_sum"] += row.score
+        day["total_questions_sum"] += row.total_questions
+        day["percentage_sum"] += percentage
+        day["perfect_scores"] += row.total_questions > 0 and row.score == row.total_questions
+        user = users.get(row.username)
+        if user is None:
+            user = users[row.username] = {
+                **dict.fromkeys(USER_SUMS, 0), "best_percentage": percentage,
+                "first_at": row.timestamp, "last_at": row.timestamp,
+            }
+        user["results"] += 1
+        user["score_sum"] += row.score
+        user["total_questions_sum"] += row.total_questions
+        user["percentage_sum"] += percentage
+        user["best_percentage"] = max(user["best_percentage"], percentage)
+        user["first_at"] = min(user["first_at"], row.timestamp)
+        user["last_at"] = max(user["last_at"], row.timestamp)
+    return days, users
+
+def _add_rollups(db: Session, days: dict, users: dict) -> None:
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = models.ResultDailyRollup.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.day],
+        set_={name: table.c[name] + stmt.excluded[name] for name in DAILY_SUMS},
+    )
+    db.execute(stmt, [{"day": day, **totals} for day, totals in days.items()])
+
+    table = models.ResultUserRollup.__table__
+    stmt = insert(table)
+    excluded = stmt.excluded
+    set_ = {name: table.c[name] + excluded[name] for name in USER_SUMS}
+    set_["best_percentage"] = case(
+        (excluded.best_percentage > table.c.best_percentage, excluded.best_percentage), else_=table.c.best_percentage
+    )
+    set_["first_at"] = case((excluded.first_at < table.c.first_at, excluded.first_at), else_=table.c.first_at)
+    set_["last_at"] = case((excluded.last_at > table.c.last_at, excluded.last_at), else_=table.c.last_at)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.username], set_=set_)
+    db.execute(stmt, [{"username": username, **totals} for username, totals in users.items()])
+
+def run(
+    cutoff: datetime.datetime,
+    archive_dir: str = ARCHIVE_DIR,
+    batch_size: int = BATCH_SIZE,
+    pause: float = BATCH_PAUSE,
+    stop: Optional[threading.Event] = None,
+) -> Optional[dict]:
+    """Archive, roll up and delete results older than ``cutoff``.
+
+    Returns None without doing anything if another process is already running
+    retention on ``archive_dir``.
+    """
+    import fcntl
+
+    os.makedirs(archive_dir, exist_ok=True)
+    lock_fd = os.open(os.path.join(archive_dir, "retention.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        started_at = datetime.datetime.utcnow()
+        archived = batches = 0
+        while stop is None or not stop.is_set():
+            db = SessionLocal()
+            try:
+                rows, sheets = _read_batch(db, cutoff, batch_size)
+                # End the read transaction: SQLite cannot upgrade a read
+                # snapshot to a write once another writer has committed
+                db.rollback()
+                if not rows:
+                    break
+                _archive(archive_dir, rows, sheets)
+                _add_rollups(db, *_rollups(rows))
+                db.execute(delete(models.Result).where(models.Result.id.in_([row.id for row in rows])))
+                db.commit()
+            finally:
+                db.close()
+            for collection_id in {sheet.collection_id for sheet in sheets.values()}:
+                versions.bump(("answers", collection_id))
+            archived += len(rows)
+            batches += 1
+            if len(rows) < batch_size:
+                break
+            if pause > 0:
+                time.sleep(pause)
+        summary = {
+            "cutoff": cutoff,
+            "started_at": started_at,
+            "finished_at": datetime.datetime.utcnow(),
+            "archived": archived,
+            "batches": batches,
+        }
+        db = SessionLocal()
+        try:
+            db.add(models.RetentionRun(**summary))
+            db.commit()
+        finally:
+            db.close()
+        logger.info("retention: archived %d results older than %s in %d batches", archived, cutoff, batches)
+        return summary
+    finally:
+        os.close(lock_fd)
+
+def pending(db: Session, cutoff: datetime.datetime) -> dict:
+    count, oldest = db.execute(
+        select(func.count(), func.min(models.Result.timestamp)).where(models.Result.timestamp < cutoff)
+    ).one()
+    return {"cutoff": cutoff, "results": count, "oldest": oldest}
+
+def last_run(db: Session) -> Optional[dict]:
+    run = db.execute(select(models.RetentionRun).order_by(models.RetentionRun.id.desc()).limit(1)).scalar()
+    if run is None:
+        return None
+    return {
+        "cutoff": run.cutoff,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "archived": run.archived,
+        "batches": run.batches,
+    }
+
+class RetentionWorker:
+    """Runs retention every ``interval`` seconds on a daemon thread.
+
+    With several workers or hosts sharing ARCHIVE_DIR only one runs at a
+    time; the others find the lock taken and skip that round.
+    """
+
+    def __init__(self, days: int, interval: float = 3600):
+        self.days = days
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.archived = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="results-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop after the batch in progress."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                summary = run(cutoff_for(self.days), stop=self._stop)
+                if summary is None:
+                    self.skipped += 1
+                else:
+                    self.runs += 1
+                    self.archived += summary["archived"]
+            except Exception:
+                self.failed += 1
+                logger.exception("results retention run failed")
+            self._stop.wait(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "retention_days": self.days,
+            "interval": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "archived": self.archived,
+        }
+
+# None unless RESULTS_RETENTION_DAYS is set
+retention_worker = RetentionWorker(RETENTION_DAYS, INTERVAL) if RETENTION_DAYS > 0 else None
+
+# Reports: rollups plus the rows still in results
+
+def _as_date(value) -> datetime.date:
+    # func.date() gives a date on PostgreSQL and an ISO string on SQLite
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+def _averages(results: int, score_sum: int, percentage_sum: float) -> dict:
+    return {
+        "results": results,
+        "average_score": round(score_sum / results, 2) if results else 0.0,
+        "average_percentage": round(percentage_sum / results, 2) if results else 0.0,
+    }
+
+def daily_report(
+    db: Session, since: Optional[datetime.date] = None, until: Optional[datetime.date] = None
+) -> List[dict]:
+    """Per-day totals from ``since`` (inclusive) to ``until`` (exclusive)."""
+    totals: Dict[datetime.date, List] = {}
+    stmt = select(models.ResultDailyRollup)
+    if since is not None:
+        stmt = stmt.where(models.ResultDailyRollup.day >= since)
+    if until is not None:
+        stmt = stmt.where(models.ResultDailyRollup.day < until)
+    for rollup in db.execute(stmt).scalars():
+        totals[rollup.day] = [getattr(rollup, name) for name in DAILY_SUMS]
+
+    day = func.date(models.Result.timestamp)
+    stmt = (
+        select(
+            day, func.count(), func.sum(models.Result.score), func.sum(models.Result.total_questions),
+            func.sum(_PERCENTAGE), func.sum(_PERFECT),
+        )
+        .where(models.Result.timestamp.is_not(None))
+        .group_by(day)
+    )
+    if since is not None:
+        stmt = stmt.where(models.Result.timestamp >= datetime.datetime.combine(since, datetime.time.min))
+    if until is not None:
+        stmt = stmt.where(models.Result.timestamp < datetime.datetime.combine(until, datetime.time.min))
+    for value, *sums in db.execute(stmt):
+        current = totals.setdefault(_as_date(value), [0] * len(DAILY_SUMS))
+        for i, amount in enumerate(sums):
+            current[i] += amount or 0
+
+    return [
+        {"day": day, **_averages(results, score_sum, float(percentage_sum)), "perfect_scores": int(perfect)}
+        for day, (results, score_sum, _, percentage_sum, perfect) in sorted(totals.items())
+    ]
+
+def user_report(db: Session, username: str) -> Optional[dict]:
+    """All-time totals for one user, or None if they have no results."""
+    rollup = db.get(models.ResultUserRollup, username)
+    count, score_sum, percentage_sum, best, first_at, last_at = db.execute(
+        select(
+            func.count(), func.sum(models.Result.score), func.sum(_PERCENTAGE),
+            func.max(_PERCENTAGE), func.min(models.Result.timestamp), func.max(models.Result.timestamp),
+        ).where(models.Result.username == username)
+    ).one()
+    score_sum = score_sum or 0
+    percentage_sum = float(percentage_sum or 0)
+    best = float(best) if best is not None else None
+    if rollup is not None:
+        count += rollup.results
+        score_sum += rollup.score_sum
+        percentage_sum += rollup.percentage_sum
+        best = rollup.best_percentage if best is None else max(best, rollup.best_percentage)
+        first_at = rollup.first_at if first_at is None else min(first_at, rollup.first_at)
+        last_at = rollup.last_at if last_at is None else max(last_at, rollup.last_at)
+    if not count:
+        return None
+    return {
+        "username": username,
+        **_averages(count, score_sum, percentage_sum),
+        "best_percentage": round(best, 2),
+        "first_at": first_at,
+        "last_at": last_at,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive old results and roll them up.")
+    parser.add_argument("--older-than-days", type=int, default=RETENTION_DAYS or None, required=not RETENTION_DAYS,
+                        help="archive results from before the start of the UTC day this many days ago")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only report how many results would be archived")
+    args = parser.parse_args()
+    # The rollup tables may not exist yet if the app has not run since they were added
+    models.Base.metadata.create_all(bind=engine)
+    cutoff = cutoff_for(args.older_than_days)
+    if args.dry_run:
+        db = SessionLocal()
+        try:
+            found = pending(db, cutoff)
+        finally:
+            db.close()
+        print(f"{found['results']} results older than {cutoff:%Y-%m-%d} (oldest {found['oldest']})")
+        return
+    summary = run(cutoff, args.archive_dir, args.batch_size)
+    if summary is None:
+        raise SystemExit(f"retention is already running on {args.archive_dir}")
+    print(f"Archived {summary['archived']} results older than {cutoff:%Y-%m-%d} to {args.archive_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import async_crud, schemas
+from ..database import get_async_db
+from ..fastjson import FAST_JSON, fast_response
+from ..versions import conditional_get
+from typing import List
+
+# Async twin of categories.router, mounted instead of it when DB_ASYNC is set
+router = APIRouter()
+
+@router.get("/categories", response_model=List[schemas.CategoryOut])
+async def list_categories(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    not_modified = conditional_get(request, response, ("categories",))
+    if not_modified:
+        return not_modified
+    categories = await async_crud.get_categories(db)
+    if FAST_JSON:
+        return fast_response([{"name": c.name, "id": c.id} for c in categories], response)
+    return categories
+
+@router.post("/categories", response_model=schemas.CategoryOut)
+async def create_category(category: schemas.CategoryCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.create_category(db, category)
+
+@router.delete("/categories/{category_id}", status_code=204)
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await async_crud.delete_category(db, category_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return None
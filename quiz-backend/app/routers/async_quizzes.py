@@ -0,0 +1,143 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import async_crud, compression, crud, schemas, database
+from ..database import get_async_db
+from ..fastjson import FAST_JSON, dumps, fast_response
+from ..versions import conditional_get
+from .quizzes import _collection_row_out, _quiz_out, _quiz_row_out
+from typing import List, Optional
+
+# Async twin of quizzes.router, mounted instead of it when DB_ASYNC is set
+router = APIRouter()
+
+@router.get("/quiz-collections", response_model=List[schemas.QuizCollectionOut])
+async def list_quiz_collections(
+    request: Request,
+    response: Response,
+    category: int = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_id: Optional[int] = Query(None),
+    sort: str = Query("id", pattern="^-?(id|created_at|title)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    not_modified = conditional_get(request, response, ("collections", category))
+    if not_modified:
+        return not_modified
+    collections = await async_crud.list_quiz_collections(db, category, limit=limit, after_id=after_id, sort=sort)
+    if FAST_JSON:
+        return fast_response([_collection_row_out(row) for row in collections], response)
+    return collections
+
+@router.post("/quiz-collections", response_model=schemas.QuizCollectionOut)
+async def create_quiz_collection(collection: schemas.QuizCollectionCreate, db: AsyncSession = Depends(get_async_db)):
+    db_collection = await async_crud.create_quiz_collection(db, collection)
+    if db_collection is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return schemas.QuizCollectionOut(
+        id=db_collection.id,
+        title=db_collection.title,
+        description=db_collection.description,
+        difficulty=db_collection.difficulty,
+        category_id=db_collection.category_id,
+        created_at=db_collection.created_at,
+        # Every question in the payload was inserted with the collection
+        question_count=len(collection.questions)
+    )
+
+@router.get("/quiz-collections/{collection_id}/questions", response_model=List[schemas.QuizOut])
+async def get_questions_by_collection(
+    collection_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)
+):
+    not_modified = conditional_get(request, response, ("questions", collection_id))
+    if not_modified:
+        return not_modified
+    if compression.body_cache is not None:
+        async def load():
+            return dumps([_quiz_row_out(row) for row in await async_crud.get_quiz_rows_by_collection(db, collection_id)])
+        return await compression.acached_response(request, response, ("questions", collection_id), load)
+    if FAST_JSON:
+        rows = await async_crud.get_quiz_rows_by_collection(db, collection_id)
+        return fast_response([_quiz_row_out(row) for row in rows], response)
+    return [_quiz_out(q) for q in await async_crud.get_quizzes_by_collection(db, collection_id)]
+
+@router.patch("/quiz-collections/{collection_id}/questions", response_model=List[schemas.QuizOut])
+async def patch_questions(collection_id: int, batch: schemas.QuestionBatch, db: AsyncSession = Depends(get_async_db)):
+    try:
+        rows = await async_crud.apply_question_batch(db, collection_id, batch)
+    except crud.UnknownQuestions as e:
+        raise HTTPException(status_code=404, detail=f"Quiz not found: {e.ids}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Quiz collection not found")
+    questions = [_quiz_row_out(row) for row in rows]
+    if FAST_JSON:
+        return fast_response(questions)
+    return questions
+
+@router.delete("/quiz-collections/{collection_id}", status_code=204)
+async def delete_quiz_collection(collection_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await async_crud.delete_quiz_collection(db, collection_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Quiz collection not found")
+    return None
+
+async def _stream_quiz_rows(category_id: int, rows_per_chunk: int = 200):
+    async with database.AsyncSessionLocal() as db:
+        yield b"["
+        chunk = []
+        separator = b""
+        async for row in async_crud.iter_quiz_rows_by_category(db, category_id):
+            chunk.append(dumps(_quiz_row_out(row)))
+            if len(chunk) >= rows_per_chunk:
+                yield separator + b",".join(chunk)
+                separator = b","
+                chunk = []
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]"
+
+# Legacy endpoints for backward compatibility
+@router.get("/quizzes", response_model=List[schemas.QuizOut])
+async def list_quizzes(
+    request: Request,
+    response: Response,
+    category: int = Query(...),
+    stream: bool = Query(False),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if stream:
+        return StreamingResponse(_stream_quiz_rows(category), media_type="application/json")
+    not_modified = conditional_get(request, response, ("category_questions", category))
+    if not_modified:
+        return not_modified
+    if compression.body_cache is not None:
+        async def load():
+            return dumps([_quiz_row_out(row) for row in await async_crud.get_quiz_rows_by_category(db, category)])
+        return await compression.acached_response(request, response, ("category_questions", category), load)
+    questions = [_quiz_row_out(row) for row in await async_crud.get_quiz_rows_by_category(db, category)]
+    if FAST_JSON:
+        return fast_response(questions, response)
+    return questions
+
+@router.post("/quizzes", response_model=schemas.QuizOut)
+async def create_quiz(quiz: schemas.QuizCreate, db: AsyncSession = Depends(get_async_db)):
+    db_quiz = await async_crud.create_quiz(db, quiz)
+    if db_quiz is None:
+        raise HTTPException(status_code=404, detail="Quiz collection not found")
+    return _quiz_out(db_quiz)
+
+@router.put("/quizzes/{quiz_id}", response_model=schemas.QuizOut)
+async def update_quiz(quiz_id: int, quiz: schemas.QuizUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_quiz = await async_crud.update_quiz(db, quiz_id, quiz)
+    if not db_quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    return _quiz_out(db_quiz)
+
+@router.delete("/quizzes/{quiz_id}", status_code=204)
+async def delete_quiz(quiz_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await async_crud.delete_quiz(db, quiz_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    return None
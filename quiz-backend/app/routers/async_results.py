@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import async_crud, schemas, ingest
+from ..database import get_async_db
+from .results import _invalid_cursor, _paginate, _queue_result
+from typing import List, Optional
+import datetime
+
+# Async twin of results.router, mounted instead of it when DB_ASYNC is set
+router = APIRouter()
+
+@router.post("/results", response_model=schemas.ResultOut, responses={202: {"model": schemas.ResultReceipt}})
+async def create_result(result: schemas.ResultCreate, db: AsyncSession = Depends(get_async_db)):
+    if ingest.results_batcher is not None:
+        # Never block the event loop waiting for queue space
+        return _queue_result(result, timeout=0)
+    return await async_crud.create_result(db, result)
+
+@router.get("/results", response_model=List[schemas.ResultOut])
+async def list_results(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    username: Optional[str] = Query(None),
+    since: Optional[datetime.datetime] = Query(None),
+    until: Optional[datetime.datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        page = await async_crud.get_results(db, limit, cursor, username, since, until)
+    except ValueError:
+        raise _invalid_cursor()
+    return _paginate(response, page, limit)
+
+@router.get("/results/{username}", response_model=List[schemas.ResultOut])
+async def user_history(
+    username: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    since: Optional[datetime.datetime] = Query(None),
+    until: Optional[datetime.datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        page = await async_crud.get_results(db, limit, cursor, username, since, until)
+    except ValueError:
+        raise _invalid_cursor()
+    return _paginate(response, page, limit)
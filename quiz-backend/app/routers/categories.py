@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from .. import crud, schemas, database
+from ..fastjson import FAST_JSON, fast_response
+from ..versions import conditional_get
 from typing import List
 
 router = APIRouter()
@@ -13,8 +15,14 @@ def get_db():
         db.close()
 
 @router.get("/categories", response_model=List[schemas.CategoryOut])
-def list_categories(db: Session = Depends(get_db)):
-    return crud.get_categories(db)
+def list_categories(request: Request, response: Response, db: Session = Depends(get_db)):
+    not_modified = conditional_get(request, response, ("categories",))
+    if not_modified:
+        return not_modified
+    categories = crud.get_categories(db)
+    if FAST_JSON:
+        return fast_response([{"name": c.name, "id": c.id} for c in categories], response)
+    return categories
 
 @router.post("/categories", response_model=schemas.CategoryOut)
 def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db)):
@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from .. import events
+from typing import Iterable, Optional
+import asyncio
+
+router = APIRouter()
+
+# Served from the in-process broker; no database access on these routes
+
+KEEPALIVE_SECONDS = 15.0
+
+def _topics(topics: Optional[str], default: Iterable[str]) -> frozenset:
+    if topics is None:
+        return frozenset(default)
+    names = {name.strip() for name in topics.split(",") if name.strip()}
+    unknown = names - set(events.TOPICS)
+    if unknown or not names:
+        raise HTTPException(status_code=422, detail=f"Unknown topics: {sorted(unknown)}; use {', '.join(events.TOPICS)}")
+    return frozenset(names)
+
+def _subscribe(topics: frozenset) -> events.Subscription:
+    try:
+        return events.broker.subscribe(topics)
+    except events.TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many subscribers", headers={"Retry-After": "5"})
+
+async def _sse_stream(sub: events.Subscription):
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            batch = await events.broker.next_batch(sub, KEEPALIVE_SECONDS)
+            if batch is None:
+                yield b": keepalive\n\n"
+                continue
+            pending, dropped = batch
+            if not pending and not dropped:
+                return  # the broker is shutting down
+            frame = b"".join(event.sse for event in pending)
+            if dropped:
+                frame = b"event: dropped\ndata: " + events.dropped_notice(dropped) + b"\n\n" + frame
+            yield frame
+    finally:
+        events.broker.unsubscribe(sub)
+
+@router.get("/events")
+async def event_stream(topics: Optional[str] = Query(None, description="Comma-separated; default all")):
+    """Server-sent events for results, leaderboard and catalog changes."""
+    sub = _subscribe(_topics(topics, events.TOPICS))
+    return StreamingResponse(
+        _sse_stream(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/events/stats")
+def event_stats():
+    return events.broker.stats()
+
+@router.websocket("/ws/results")
+async def results_socket(websocket: WebSocket, topics: Optional[str] = None):
+    """New results and leaderboard standings; each message is a JSON array of events."""
+    try:
+        sub = _subscribe(_topics(topics, ("results", "leaderboard")))
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == 503 else 1008)
+        return
+    await websocket.accept()
+
+    async def watch_disconnect():
+        # Client messages are ignored; this only notices the socket closing
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            events.broker.unsubscribe(sub)
+
+    reader = asyncio.create_task(watch_disconnect())
+    shutting_down = False
+    try:
+        while True:
+            batch = await events.broker.next_batch(sub, KEEPALIVE_SECONDS)
+            if batch is None:
+                continue
+            pending, dropped = batch
+            if not pending and not dropped:
+                # Closed either by the client (the reader is done) or by the broker on shutdown
+                shutting_down = not reader.done()
+                break
+            parts = [event.data for event in pending]
+            if dropped:
+                parts.insert(0, events.dropped_notice(dropped))
+            await websocket.send_text((b"[" + b",".join(parts) + b"]").decode("utf-8"))
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        pass
+    finally:
+        events.broker.unsubscribe(sub)
+        reader.cancel()
+    if shutting_down:
+        await websocket.close(code=1001)
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from .. import crud, grading, item_stats, schemas, database
+import datetime
+
+router = APIRouter()
+
+def get_db():
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _grade(db: Session, collection_id: int, submissions: list) -> list:
+    key = grading.answer_key(db, collection_id)
+    if not key.question_ids:
+        raise HTTPException(status_code=404, detail="Quiz collection not found or has no questions")
+    try:
+        matrix = grading.answer_matrix([s.answers for s in submissions], len(key.key))
+    except grading.InvalidAnswers as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    scores, correct = grading.grade_matrix(key, matrix)
+    total_questions = len(key.question_ids)
+    rows = grading.grade_rows(
+        [s.username for s in submissions], scores, total_questions, datetime.datetime.utcnow()
+    )
+    # The chosen options are kept for item analysis, one packed row per result
+    sheets = crud.AnswerSheets(
+        collection_id, grading.layout_id(db, collection_id, key), [answers.tobytes() for answers in matrix]
+    )
+    result_ids = crud.create_results(db, rows, sheets)
+    return [
+        {
+            "result_id": result_id,
+            "username": row["username"],
+            "score": row["score"],
+            "total_questions": total_questions,
+            "correct": mask.tolist(),
+        }
+        for result_id, row, mask in zip(result_ids, rows, correct)
+    ]
+
+@router.post("/quiz-collections/{collection_id}/grade", response_model=schemas.GradeOut)
+def grade_submission(collection_id: int, submission: schemas.GradeSubmission, db: Session = Depends(get_db)):
+    return _grade(db, collection_id, [submission])[0]
+
+@router.post("/quiz-collections/{collection_id}/grade/bulk", response_model=schemas.BulkGradeOut)
+def grade_submissions(collection_id: int, request: schemas.BulkGradeRequest, db: Session = Depends(get_db)):
+    results = _grade(db, collection_id, request.submissions)
+    return {
+        "collection_id": collection_id,
+        "total_questions": results[0]["total_questions"],
+        "results": results,
+    }
+
+@router.get("/quiz-collections/{collection_id}/stats", response_model=schemas.CollectionStatsOut)
+def collection_stats(collection_id: int, db: Session = Depends(get_db)):
+    stats = item_stats.collection_stats(db, collection_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Quiz collection not found or has no questions")
+    return stats
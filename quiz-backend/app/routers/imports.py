@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from .. import database
+from ..bulk_import import import_stream
+from typing import Optional
+import io
+import os
+import tempfile
+
+router = APIRouter()
+
+# Request bodies above this size spill from memory to a temp file
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+# Larger request bodies are refused with 413
+MAX_BODY_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", 256 * 1024 * 1024))
+
+def _run_import(spool, fmt: str, chunk_size: int) -> dict:
+    db = database.SessionLocal()
+    try:
+        with io.TextIOWrapper(spool, encoding="utf-8", newline="") as stream:
+            return import_stream(db, stream, fmt, chunk_size)
+    finally:
+        db.close()
+
+@router.post("/quiz-collections/import")
+async def import_quiz_collections(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(jsonl|csv)$"),
+    chunk_size: int = Query(1000, ge=1, le=50000),
+):
+    """Import collections from a JSON Lines or CSV request body and report throughput."""
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "jsonl")
+    too_large = HTTPException(status_code=413, detail=f"Import body exceeds {MAX_BODY_BYTES} bytes")
+    if int(request.headers.get("content-length") or 0) > MAX_BODY_BYTES:
+        raise too_large
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_BODY_BYTES:
+                raise too_large
+            # Past SPOOL_MAX_MEMORY this is a disk write, so keep it off the event loop
+            await run_in_threadpool(spool.write, chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return await run_in_threadpool(_run_import, spool, fmt, chunk_size)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+from .. import schemas
+from ..leaderboard import leaderboard
+
+router = APIRouter()
+
+WINDOW_PATTERN = "^(day|week|all)$"
+
+# Served from the in-memory boards; no database access on these routes
+
+@router.get("/leaderboard", response_model=schemas.LeaderboardOut)
+def get_leaderboard(window: str = Query("all", pattern=WINDOW_PATTERN), limit: int = Query(10, ge=1, le=1000)):
+    period, entries = leaderboard.top(window, limit)
+    return {"window": window, "period": period, "entries": entries}
+
+@router.get("/leaderboard/{username}", response_model=schemas.LeaderboardEntryOut)
+def get_rank(username: str, window: str = Query("all", pattern=WINDOW_PATTERN)):
+    _, entry = leaderboard.rank(window, username)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No results for this user in this window")
+    return entry
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from .. import grading, quiz_sessions, schemas, database
+from typing import List
+
+router = APIRouter()
+
+def get_db():
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _session_out(session, questions: List) -> dict:
+    return {
+        "id": session.id,
+        "category_id": session.category_id,
+        "difficulty": session.difficulty,
+        "seed": session.seed,
+        "created_at": session.created_at,
+        "completed_at": session.completed_at,
+        "result_id": session.result_id,
+        "questions": [
+            {
+                "id": q.id,
+                "question": q.question,
+                "options": [q.option1, q.option2, q.option3, q.option4],
+                "collection_id": q.collection_id,
+            }
+            for q in questions
+        ],
+    }
+
+@router.post("/quiz-sessions", response_model=schemas.QuizSessionOut)
+def create_quiz_session(request: schemas.QuizSessionCreate, db: Session = Depends(get_db)):
+    try:
+        session, questions = quiz_sessions.create_session(
+            db, request.category_id, request.difficulty, request.count, request.seed
+        )
+    except quiz_sessions.NotEnoughQuestions as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return _session_out(session, questions)
+
+@router.get("/quiz-sessions/{session_id}", response_model=schemas.QuizSessionOut)
+def get_quiz_session(session_id: str, db: Session = Depends(get_db)):
+    found = quiz_sessions.get_session(db, session_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Quiz session not found")
+    return _session_out(*found)
+
+@router.post("/quiz-sessions/{session_id}/submit", response_model=schemas.GradeOut)
+def submit_quiz_session(session_id: str, submission: schemas.QuizSessionSubmission, db: Session = Depends(get_db)):
+    try:
+        graded = quiz_sessions.submit(db, session_id, submission.username, submission.answers)
+    except grading.InvalidAnswers as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    except quiz_sessions.SessionClosed as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if graded is None:
+        raise HTTPException(status_code=404, detail="Quiz session not found")
+    return graded
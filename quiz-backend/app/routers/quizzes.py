@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from .. import crud, schemas, database
+from .. import compression, crud, models, schemas, database
+from ..fastjson import FAST_JSON, dumps, fast_response
+from ..versions import conditional_get
 from typing import List, Optional
 
 router = APIRouter()
@@ -12,29 +15,38 @@ def get_db():
     finally:
         db.close()
 
+def _quiz_out(q: models.Quiz) -> schemas.QuizOut:
+    return schemas.QuizOut(
+        id=q.id,
+        question=q.question,
+        options=[q.option1, q.option2, q.option3, q.option4],
+        correct_answer=q.correct_answer,
+        collection_id=q.collection_id
+    )
+
 @router.get("/quiz-collections", response_model=List[schemas.QuizCollectionOut])
-def list_quiz_collections(category: int = Query(...), db: Session = Depends(get_db)):
-    collections = crud.get_quiz_collections_by_category(db, category)
-    # Add question count to each collection
-    result = []
-    for collection in collections:
-        questions = crud.get_quizzes_by_collection(db, collection.id)
-        collection_dict = {
-            "id": collection.id,
-            "title": collection.title,
-            "description": collection.description,
-            "difficulty": collection.difficulty,
-            "category_id": collection.category_id,
-            "created_at": collection.created_at,
-            "question_count": len(questions)
-        }
-        result.append(collection_dict)
-    return result
+def list_quiz_collections(
+    request: Request,
+    response: Response,
+    category: int = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_id: Optional[int] = Query(None),
+    sort: str = Query("id", pattern="^-?(id|created_at|title)$"),
+    db: Session = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ("collections", category))
+    if not_modified:
+        return not_modified
+    collections = crud.list_quiz_collections(db, category, limit=limit, after_id=after_id, sort=sort)
+    if FAST_JSON:
+        return fast_response([_collection_row_out(row) for row in collections], response)
+    return collections
 
 @router.post("/quiz-collections", response_model=schemas.QuizCollectionOut)
 def create_quiz_collection(collection: schemas.QuizCollectionCreate, db: Session = Depends(get_db)):
     db_collection = crud.create_quiz_collection(db, collection)
-    questions = crud.get_quizzes_by_collection(db, db_collection.id)
+    if db_collection is None:
+        raise HTTPException(status_code=404, detail="Category not found")
     return schemas.QuizCollectionOut(
         id=db_collection.id,
         title=db_collection.title,
@@ -42,20 +54,41 @@ def create_quiz_collection(collection: schemas.QuizCollectionCreate, db: Session
         difficulty=db_collection.difficulty,
         category_id=db_collection.category_id,
         created_at=db_collection.created_at,
-        question_count=len(questions)
+        # Every question in the payload was inserted with the collection
+        question_count=len(collection.questions)
     )
 
 @router.get("/quiz-collections/{collection_id}/questions", response_model=List[schemas.QuizOut])
-def get_questions_by_collection(collection_id: int, db: Session = Depends(get_db)):
+def get_questions_by_collection(
+    collection_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    not_modified = conditional_get(request, response, ("questions", collection_id))
+    if not_modified:
+        return not_modified
+    if compression.body_cache is not None:
+        return compression.cached_response(request, response, ("questions", collection_id), lambda: dumps(
+            [_quiz_row_out(row) for row in crud.get_quiz_rows_by_collection(db, collection_id)]
+        ))
+    if FAST_JSON:
+        return fast_response([_quiz_row_out(row) for row in crud.get_quiz_rows_by_collection(db, collection_id)], response)
     questions = crud.get_quizzes_by_collection(db, collection_id)
     # Map options fields to list
-    return [schemas.QuizOut(
-        id=q.id,
-        question=q.question,
-        options=[q.option1, q.option2, q.option3, q.option4],
-        correct_answer=q.correct_answer,
-        collection_id=q.collection_id
-    ) for q in questions]
+    return [_quiz_out(q) for q in questions]
+
+@router.patch("/quiz-collections/{collection_id}/questions", response_model=List[schemas.QuizOut])
+def patch_questions(collection_id: int, batch: schemas.QuestionBatch, db: Session = Depends(get_db)):
+    try:
+        rows = crud.apply_question_batch(db, collection_id, batch)
+    except crud.UnknownQuestions as e:
+        raise HTTPException(status_code=404, detail=f"Quiz not found: {e.ids}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Quiz collection not found")
+    questions = [_quiz_row_out(row) for row in rows]
+    if FAST_JSON:
+        return fast_response(questions)
+    return questions
 
 @router.delete("/quiz-collections/{collection_id}", status_code=204)
 def delete_quiz_collection(collection_id: int, db: Session = Depends(get_db)):
@@ -64,47 +97,85 @@ def delete_quiz_collection(collection_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Quiz collection not found")
     return None
 
+def _collection_row_out(row) -> dict:
+    # Keys in QuizCollectionOut field order
+    return {
+        "title": row["title"],
+        "description": row["description"],
+        "difficulty": row["difficulty"],
+        "category_id": row["category_id"],
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "question_count": row["question_count"],
+    }
+
+def _quiz_row_out(row) -> dict:
+    # Keys in QuizOut field order
+    id, question, option1, option2, option3, option4, correct_answer, collection_id = row
+    return {
+        "id": id,
+        "question": question,
+        "options": [option1, option2, option3, option4],
+        "correct_answer": correct_answer,
+        "collection_id": collection_id,
+    }
+
+def _stream_quiz_rows(category_id: int, rows_per_chunk: int = 200):
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the generator owns its own session for the lifetime of the cursor.
+    db = database.SessionLocal()
+    try:
+        yield b"["
+        chunk = []
+        separator = b""
+        for row in crud.iter_quiz_rows_by_category(db, category_id):
+            chunk.append(dumps(_quiz_row_out(row)))
+            if len(chunk) >= rows_per_chunk:
+                yield separator + b",".join(chunk)
+                separator = b","
+                chunk = []
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]"
+    finally:
+        db.close()
+
 # Legacy endpoints for backward compatibility
 @router.get("/quizzes", response_model=List[schemas.QuizOut])
-def list_quizzes(category: int = Query(...), db: Session = Depends(get_db)):
-    # Get all collections for the category and flatten their questions
-    collections = crud.get_quiz_collections_by_category(db, category)
-    all_questions = []
-    for collection in collections:
-        questions = crud.get_quizzes_by_collection(db, collection.id)
-        for q in questions:
-            all_questions.append(schemas.QuizOut(
-                id=q.id,
-                question=q.question,
-                options=[q.option1, q.option2, q.option3, q.option4],
-                correct_answer=q.correct_answer,
-                collection_id=q.collection_id
-            ))
-    return all_questions
+def list_quizzes(
+    request: Request,
+    response: Response,
+    category: int = Query(...),
+    stream: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    if stream:
+        return StreamingResponse(_stream_quiz_rows(category), media_type="application/json")
+    not_modified = conditional_get(request, response, ("category_questions", category))
+    if not_modified:
+        return not_modified
+    if compression.body_cache is not None:
+        return compression.cached_response(request, response, ("category_questions", category), lambda: dumps(
+            [_quiz_row_out(row) for row in crud.get_quiz_rows_by_category(db, category)]
+        ))
+    questions = [_quiz_row_out(row) for row in crud.get_quiz_rows_by_category(db, category)]
+    if FAST_JSON:
+        return fast_response(questions, response)
+    return questions
 
 @router.post("/quizzes", response_model=schemas.QuizOut)
 def create_quiz(quiz: schemas.QuizCreate, db: Session = Depends(get_db)):
     db_quiz = crud.create_quiz(db, quiz)
-    return schemas.QuizOut(
-        id=db_quiz.id,
-        question=db_quiz.question,
-        options=[db_quiz.option1, db_quiz.option2, db_quiz.option3, db_quiz.option4],
-        correct_answer=db_quiz.correct_answer,
-        collection_id=db_quiz.collection_id
-    )
+    if db_quiz is None:
+        raise HTTPException(status_code=404, detail="Quiz collection not found")
+    return _quiz_out(db_quiz)
 
 @router.put("/quizzes/{quiz_id}", response_model=schemas.QuizOut)
 def update_quiz(quiz_id: int, quiz: schemas.QuizUpdate, db: Session = Depends(get_db)):
     db_quiz = crud.update_quiz(db, quiz_id, quiz)
     if not db_quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    return schemas.QuizOut(
-        id=db_quiz.id,
-        question=db_quiz.question,
-        options=[db_quiz.option1, db_quiz.option2, db_quiz.option3, db_quiz.option4],
-        correct_answer=db_quiz.correct_answer,
-        collection_id=db_quiz.collection_id
-    )
+    return _quiz_out(db_quiz)
 
 @router.delete("/quizzes/{quiz_id}", status_code=204)
 def delete_quiz(quiz_id: int, db: Session = Depends(get_db)):
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from .. import retention, schemas, database
+from typing import List, Optional
+import datetime
+
+router = APIRouter()
+
+def get_db():
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Reports count archived results through the retention rollups as well as the
+# rows still in results
+
+@router.get("/reports/daily", response_model=List[schemas.DailyReportOut])
+def daily_report(
+    since: Optional[datetime.date] = Query(None),
+    until: Optional[datetime.date] = Query(None),
+    db: Session = Depends(get_db),
+):
+    return retention.daily_report(db, since, until)
+
+@router.get("/reports/users/{username}", response_model=schemas.UserReportOut)
+def user_report(username: str, db: Session = Depends(get_db)):
+    report = retention.user_report(db, username)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No results for this user")
+    return report
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from .. import crud, schemas, database
-from typing import List
+from .. import crud, schemas, database, ingest
+from typing import List, Optional
+import datetime
 
 router = APIRouter()
 
@@ -12,11 +15,57 @@ def get_db():
     finally:
         db.close()
 
-@router.post("/results", response_model=schemas.ResultOut)
+def _queue_result(result: schemas.ResultCreate, timeout: float) -> JSONResponse:
+    try:
+        receipt = ingest.results_batcher.submit(result, timeout=timeout)
+    except ingest.QueueFull:
+        raise HTTPException(status_code=503, detail="Result queue is full", headers={"Retry-After": "1"})
+    return JSONResponse(status_code=202, content=jsonable_encoder(schemas.ResultReceipt(receipt=receipt)))
+
+@router.post("/results", response_model=schemas.ResultOut, responses={202: {"model": schemas.ResultReceipt}})
 def create_result(result: schemas.ResultCreate, db: Session = Depends(get_db)):
+    if ingest.results_batcher is not None:
+        return _queue_result(result, timeout=0.5)
     db_result = crud.create_result(db, result)
     return db_result
 
+def _paginate(response: Response, page: list, limit: int) -> list:
+    # A full page means there may be more; hand back the cursor for the next one
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_result_cursor(page[-1])
+    return page
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/results", response_model=List[schemas.ResultOut])
-def list_results(db: Session = Depends(get_db)):
-    return crud.get_results(db) 
\ No newline at end of file
+def list_results(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    username: Optional[str] = Query(None),
+    since: Optional[datetime.datetime] = Query(None),
+    until: Optional[datetime.datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    try:
+        page = crud.get_results(db, limit, cursor, username, since, until)
+    except ValueError:
+        raise _invalid_cursor()
+    return _paginate(response, page, limit)
+
+@router.get("/results/{username}", response_model=List[schemas.ResultOut])
+def user_history(
+    username: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    since: Optional[datetime.datetime] = Query(None),
+    until: Optional[datetime.datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    try:
+        page = crud.get_results(db, limit, cursor, username, since, until)
+    except ValueError:
+        raise _invalid_cursor()
+    return _paginate(response, page, limit) 
\ No newline at end of file
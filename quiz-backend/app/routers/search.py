@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from .. import schemas, database, search
+from typing import Optional
+
+router = APIRouter()
+
+def get_db():
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@router.get("/search", response_model=schemas.SearchOut)
+def search_questions(
+    q: str = Query(..., min_length=1, max_length=200),
+    category: Optional[int] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    db: Session = Depends(get_db),
+):
+    hits = search.search(db, q, category_id=category, limit=limit, offset=offset)
+    return {
+        "query": q,
+        "hits": hits,
+        "next_offset": offset + limit if len(hits) == limit else None,
+    }
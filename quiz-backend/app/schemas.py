@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 class CategoryBase(BaseModel):
     name: str
@@ -48,6 +48,16 @@ class QuizUpdate(BaseModel):
     options: Optional[List[str]] = None
     correct_answer: Optional[str] = None
 
+class QuestionPatch(QuizUpdate):
+    id: int
+    options: Optional[List[str]] = Field(None, min_items=4, max_items=4)
+
+class QuestionBatch(BaseModel):
+    # Applied in the order delete, update, create
+    create: List[QuizBase] = Field([], max_items=1000)
+    update: List[QuestionPatch] = Field([], max_items=1000)
+    delete: List[int] = Field([], max_items=1000)
+
 class QuizOut(BaseModel):
     id: int
     question: str
@@ -65,8 +75,120 @@ class ResultBase(BaseModel):
 class ResultCreate(ResultBase):
     pass
 
+class ResultReceipt(BaseModel):
+    receipt: str
+    status: str = "accepted"
+
 class ResultOut(ResultBase):
     id: int
     timestamp: datetime
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+class DailyReportOut(BaseModel):
+    day: date
+    results: int
+    average_score: float
+    average_percentage: float
+    perfect_scores: int
+
+class UserReportOut(BaseModel):
+    username: str
+    results: int
+    average_score: float
+    average_percentage: float
+    best_percentage: float
+    first_at: datetime
+    last_at: datetime
+
+class GradeSubmission(BaseModel):
+    username: str
+    # Option index (0-3) per question in question-id order; null = unanswered
+    answers: List[Optional[int]]
+
+class BulkGradeRequest(BaseModel):
+    submissions: List[GradeSubmission] = Field(..., min_items=1, max_items=10000)
+
+class GradeOut(BaseModel):
+    result_id: int
+    username: str
+    score: int
+    total_questions: int
+    correct: List[bool]
+
+class BulkGradeOut(BaseModel):
+    collection_id: int
+    total_questions: int
+    results: List[GradeOut]
+
+class QuestionStatsOut(BaseModel):
+    question_id: int
+    responses: int
+    unanswered: int
+    # Times each option (0-3) was chosen
+    options: List[int]
+    # Share of responses that were correct; null until answered
+    p_value: Optional[float] = None
+    # Upper-lower 27% discrimination index, -1 to 1
+    discrimination: Optional[float] = None
+    flags: List[str]
+
+class CollectionStatsOut(BaseModel):
+    collection_id: int
+    responses: int
+    questions: List[QuestionStatsOut]
+
+class QuizSessionCreate(BaseModel):
+    category_id: int
+    difficulty: Optional[str] = None
+    count: int = Field(10, ge=1, le=100)
+    # Same seed + same question pool = same questions in the same order
+    seed: Optional[int] = Field(None, ge=0, le=2**31 - 1)
+
+class SessionQuestionOut(BaseModel):
+    id: int
+    question: str
+    options: List[str]
+    collection_id: int
+
+class QuizSessionOut(BaseModel):
+    id: str
+    category_id: int
+    difficulty: Optional[str] = None
+    seed: int
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    result_id: Optional[int] = None
+    questions: List[SessionQuestionOut]
+
+class QuizSessionSubmission(BaseModel):
+    username: str
+    # Option index (0-3) per question in session order; null = unanswered
+    answers: List[Optional[int]]
+
+class SearchHit(BaseModel):
+    id: int
+    question: str
+    options: List[str]
+    collection_id: int
+    collection_title: str
+    category_id: int
+    score: float
+
+class SearchOut(BaseModel):
+    query: str
+    hits: List[SearchHit]
+    next_offset: Optional[int] = None
+
+class LeaderboardEntryOut(BaseModel):
+    rank: int
+    username: str
+    score: int
+    total_questions: int
+    percentage: float
+    achieved_at: datetime
+
+class LeaderboardOut(BaseModel):
+    window: str
+    period: str
+    entries: List[LeaderboardEntryOut] 
\ No newline at end of file
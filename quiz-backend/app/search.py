@@ -0,0 +1,167 @@
+from sqlalchemy import or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from . import models
+from typing import List, Optional
+import argparse
+import re
+
+# Full-text search over questions and their options.
+#
+# On SQLite this is an external-content FTS5 table over `quizzes`. Triggers
+# keep it in sync on every INSERT/UPDATE/DELETE of a question, which covers
+# the crud write paths, bulk import and cascaded deletes alike. Other
+# backends (or SQLite builds without FTS5) fall back to a LIKE scan.
+
+FTS_TABLE = "quizzes_fts"
+
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        question, option1, option2, option3, option4,
+        content='quizzes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS quizzes_fts_ai AFTER INSERT ON quizzes BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, question, option1, option2, option3, option4)
+        VALUES (new.id, new.question, new.option1, new.option2, new.option3, new.option4);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS quizzes_fts_ad AFTER DELETE ON quizzes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, question, option1, option2, option3, option4)
+        VALUES ('delete', old.id, old.question, old.option1, old.option2, old.option3, old.option4);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS quizzes_fts_au AFTER UPDATE ON quizzes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, question, option1, option2, option3, option4)
+        VALUES ('delete', old.id, old.question, old.option1, old.option2, old.option3, old.option4);
+        INSERT INTO {FTS_TABLE}(rowid, question, option1, option2, option3, option4)
+        VALUES (new.id, new.question, new.option1, new.option2, new.option3, new.option4);
+    END""",
+]
+
+# bm25() column weights: a hit in the question counts more than one in an option
+BM25 = f"bm25({FTS_TABLE}, 4.0, 1.0, 1.0, 1.0, 1.0)"
+
+_fts_enabled: Optional[bool] = None
+
+def ensure_index(engine: Engine) -> bool:
+    """Create the FTS table and triggers if missing; backfill it when newly created."""
+    global _fts_enabled
+    if engine.dialect.name != "sqlite":
+        _fts_enabled = False
+        return False
+    try:
+        with engine.begin() as conn:
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+            ).first() is not None
+            for statement in FTS_DDL:
+                conn.exec_driver_sql(statement)
+            if not existed:
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite compiled without FTS5
+        _fts_enabled = False
+        return False
+    _fts_enabled = True
+    return True
+
+def rebuild(engine: Engine) -> None:
+    if not ensure_index(engine):
+        raise RuntimeError("FTS5 is not available for this database")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def _match_expression(query: str) -> Optional[str]:
+    # Quote every term so user input can never be parsed as FTS syntax; the
+    # last term is a prefix match so results show up while typing.
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _hit(row, score: float) -> dict:
+    return {
+        "id": row.id,
+        "question": row.question,
+        "options": [row.option1, row.option2, row.option3, row.option4],
+        "collection_id": row.collection_id,
+        "collection_title": row.title,
+        "category_id": row.category_id,
+        "score": score,
+    }
+
+def _fts_search(db: Session, match: str, category_id: Optional[int], limit: int, offset: int) -> List[dict]:
+    sql = f"""
+        SELECT q.id, q.question, q.option1, q.option2, q.option3, q.option4, q.collection_id,
+               c.title, c.category_id, {BM25} AS rank
+        FROM {FTS_TABLE}
+        JOIN quizzes q ON q.id = {FTS_TABLE}.rowid
+        JOIN quiz_collections c ON c.id = q.collection_id
+        WHERE {FTS_TABLE} MATCH :match
+        {"AND c.category_id = :category_id" if category_id is not None else ""}
+        ORDER BY rank, q.id
+        LIMIT :limit OFFSET :offset
+    """
+    rows = db.execute(
+        text(sql), {"match": match, "category_id": category_id, "limit": limit, "offset": offset}
+    )
+    # bm25() is lower-is-better; flip it so clients see higher = more relevant
+    return [_hit(row, -row.rank) for row in rows]
+
+def _like_search(db: Session, query: str, category_id: Optional[int], limit: int, offset: int) -> List[dict]:
+    # The query is matched literally: LIKE wildcards in it are escaped
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%"
+    stmt = (
+        select(
+            models.Quiz.id,
+            models.Quiz.question,
+            models.Quiz.option1,
+            models.Quiz.option2,
+            models.Quiz.option3,
+            models.Quiz.option4,
+            models.Quiz.collection_id,
+            models.QuizCollection.title,
+            models.QuizCollection.category_id,
+        )
+        .join(models.QuizCollection, models.Quiz.collection_id == models.QuizCollection.id)
+        .where(or_(
+            models.Quiz.question.ilike(pattern, escape="\\"),
+            models.Quiz.option1.ilike(pattern, escape="\\"),
+            models.Quiz.option2.ilike(pattern, escape="\\"),
+            models.Quiz.option3.ilike(pattern, escape="\\"),
+            models.Quiz.option4.ilike(pattern, escape="\\"),
+        ))
+        .order_by(models.Quiz.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    if category_id is not None:
+        stmt = stmt.where(models.QuizCollection.category_id == category_id)
+    return [_hit(row, 0.0) for row in db.execute(stmt)]
+
+def search(db: Session, query: str, category_id: Optional[int] = None, limit: int = 20, offset: int = 0) -> List[dict]:
+    if _fts_enabled is None:
+        ensure_index(db.get_bind())
+    if not _fts_enabled:
+        return _like_search(db, query, category_id, limit, offset)
+    match = _match_expression(query)
+    if match is None:
+        return []
+    return _fts_search(db, match, category_id, limit, offset)
+
+def main() -> None:
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Manage the question full-text index.")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index from the quizzes table")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild(engine)
+        print(f"Rebuilt {FTS_TABLE}")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
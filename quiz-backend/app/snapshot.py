@@ -0,0 +1,311 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl
+from .versions import _etag_matches, versions
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Read-only catalog snapshot shared by every worker process.
+#
+# The snapshot is one file of pre-encoded JSON bodies for /categories,
+# /quiz-collections?category=N and /quiz-collections/{id}/questions, plus an
+# index of offsets. Workers mmap it, so the bodies live once in the page
+# cache however many workers there are. Put CATALOG_SNAPSHOT_DIR on tmpfs
+# (e.g. /dev/shm) to keep it in shared memory.
+#
+# Freshness is tracked by a catalog generation: an 8-byte counter in a small
+# mmapped file that every catalog write bumps (through the crud change
+# notifications), whichever worker made it. The snapshot header records the
+# generation it was built from, and the versions epoch, which changes on every
+# boot so a snapshot left over from before a restart (the database may have
+# changed meanwhile) is never served. A worker only serves from a snapshot
+# whose stamp is current and otherwise falls through to the normal route while
+# one worker (holding an flock) rebuilds it. The new file replaces the old
+# with os.replace(), and readers swap to it by reassigning one reference.
+#
+# Each body is stored with the ETag and Last-Modified the route would send
+# (versions.py), taken before the body is read, so clients see one validator
+# format whichever path answers them.
+
+SNAPSHOT_DIR = os.environ.get("CATALOG_SNAPSHOT_DIR")
+REBUILD_DELAY = float(os.environ.get("CATALOG_SNAPSHOT_DELAY", 0.2))
+
+MAGIC = b"QZCS"
+FORMAT_VERSION = 2
+# magic, format version, versions epoch, generation, index length
+HEADER = struct.Struct("<4sI16sQI")
+
+class Generation:
+    """A counter shared between processes through a memory-mapped file."""
+
+    def __init__(self, path: str):
+        import fcntl
+
+        self._fcntl = fcntl
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < 8:
+                os.ftruncate(self._fd, 8)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mm = mmap.mmap(self._fd, 8)
+
+    def get(self) -> int:
+        return struct.unpack_from("<Q", self._mm)[0]
+
+    def bump(self) -> int:
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            value = self.get() + 1
+            struct.pack_into("<Q", self._mm, 0, value)
+            return value
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+class Entry(NamedTuple):
+    offset: int
+    length: int
+    etag: str
+    last_modified: str
+
+class Mapped(NamedTuple):
+    stamp: Tuple[bytes, int]
+    file_id: tuple
+    mm: mmap.mmap
+    index: Dict[str, Entry]
+
+def _file_id(stat: os.stat_result) -> tuple:
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _stamp(generation: int) -> Tuple[bytes, int]:
+    return versions.epoch.encode("ascii").ljust(16, b"\0"), generation
+
+def _collect() -> List[Tuple[str, bytes, Dict[str, str]]]:
+    # Same statements, encoders and validators as the FAST_JSON routes, so the
+    # responses are identical to what the routes would return
+    from sqlalchemy import select
+    from . import crud, models
+    from .database import SessionLocal
+    from .fastjson import dumps
+    from .routers.quizzes import _collection_row_out, _quiz_row_out
+
+    db = SessionLocal()
+    try:
+        entries = []
+        headers = versions.headers(("categories",))
+        categories = db.execute(select(models.Category)).scalars().all()
+        entries.append(("categories", dumps([{"name": c.name, "id": c.id} for c in categories]), headers))
+        collection_ids = []
+        for category in categories:
+            headers = versions.headers(("collections", category.id))
+            rows = db.execute(crud._collection_listing(category.id)).mappings().all()
+            entries.append((f"collections/{category.id}", dumps([_collection_row_out(row) for row in rows]), headers))
+            collection_ids.extend(row["id"] for row in rows)
+
+        question_headers = {cid: versions.headers(("questions", cid)) for cid in collection_ids}
+        questions: Dict[int, list] = {cid: [] for cid in collection_ids}
+        stmt = select(*crud.QUIZ_ROW_COLUMNS).order_by(models.Quiz.collection_id, models.Quiz.id)
+        for row in db.execute(stmt.execution_options(yield_per=2000)):
+            if row.collection_id in questions:
+                questions[row.collection_id].append(_quiz_row_out(row))
+        entries.extend((f"questions/{cid}", dumps(rows), question_headers[cid]) for cid, rows in questions.items())
+        return entries
+    finally:
+        db.close()
+
+class CatalogSnapshot:
+    def __init__(self, directory: str, rebuild_delay: float = 0.2):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "catalog.snap")
+        self._lock_path = os.path.join(directory, "catalog.lock")
+        self.generation = Generation(os.path.join(directory, "catalog.gen"))
+        self.rebuild_delay = rebuild_delay
+        self._current: Optional[Mapped] = None
+        self._lock = threading.Lock()
+        self._rebuild_pending = False
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+
+    def _load(self, stamp: Tuple[bytes, int]) -> Optional[Mapped]:
+        """Map the snapshot file if it is current; None if it is missing or stale."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        current = self._current
+        if current is not None and current.file_id == _file_id(stat):
+            return None  # already looked at this file and it was stale
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, epoch, file_generation, index_length = HEADER.unpack_from(mm)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            mm.close()
+            return None
+        base = HEADER.size + index_length
+        index = {
+            key: Entry(base + offset, length, etag, last_modified)
+            for key, (offset, length, etag, last_modified) in json.loads(mm[HEADER.size:base]).items()
+        }
+        mapped = Mapped((epoch, file_generation), _file_id(stat), mm, index)
+        # Swapping is one reference assignment; requests holding the old
+        # mapping finish with it and it is unmapped once unreferenced
+        self._current = mapped
+        return mapped if mapped.stamp == stamp else None
+
+    def lookup(self, key: str) -> Optional[Tuple[bytes, Entry]]:
+        stamp = _stamp(self.generation.get())
+        current = self._current
+        if current is None or current.stamp != stamp:
+            current = self._load(stamp)
+            if current is None:
+                self.misses += 1
+                self.schedule_rebuild()
+                return None
+        entry = current.index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return current.mm[entry.offset:entry.offset + entry.length], entry
+
+    def build(self) -> bool:
+        """Write a snapshot for the current generation unless another worker is on it."""
+        import fcntl
+
+        lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            # Read before the catalog: a write during the build leaves this
+            # snapshot one generation behind, so it is never served stale
+            stamp = _stamp(self.generation.get())
+            if self._file_stamp() == stamp:
+                return False
+            started = time.perf_counter()
+            entries = _collect()
+            index, offset = {}, 0
+            for key, body, headers in entries:
+                index[key] = (offset, len(body), headers["ETag"], headers["Last-Modified"])
+                offset += len(body)
+            encoded_index = json.dumps(index, separators=(",", ":")).encode("utf-8")
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, *stamp, len(encoded_index)))
+                f.write(encoded_index)
+                for _, body, _ in entries:
+                    f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.builds += 1
+            logger.info(
+                "catalog snapshot generation %d: %d entries, %d bytes in %.3fs",
+                stamp[1], len(entries), offset, time.perf_counter() - started,
+            )
+            return True
+        finally:
+            os.close(lock_fd)
+
+    def _file_stamp(self) -> Optional[Tuple[bytes, int]]:
+        try:
+            with open(self.path, "rb") as f:
+                magic, version, epoch, generation, _ = HEADER.unpack(f.read(HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        return (epoch, generation) if magic == MAGIC and version == FORMAT_VERSION else None
+
+    def schedule_rebuild(self) -> None:
+        # Debounced so a burst of writes (e.g. an import) costs one rebuild
+        with self._lock:
+            if self._rebuild_pending:
+                return
+            self._rebuild_pending = True
+        timer = threading.Timer(self.rebuild_delay, self._rebuild)
+        timer.daemon = True
+        timer.start()
+
+    def _rebuild(self) -> None:
+        with self._lock:
+            self._rebuild_pending = False
+        try:
+            self.build()
+        except Exception:
+            logger.exception("catalog snapshot build failed")
+
+    def invalidate(self) -> None:
+        self.generation.bump()
+        self.schedule_rebuild()
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "generation": self.generation.get(),
+            "snapshot_generation": current.stamp[1] if current is not None else None,
+            "entries": len(current.index) if current is not None else 0,
+            "bytes": len(current.mm) if current is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "builds": self.builds,
+        }
+
+catalog_snapshot = CatalogSnapshot(SNAPSHOT_DIR, REBUILD_DELAY) if SNAPSHOT_DIR else None
+
+def invalidate() -> None:
+    if catalog_snapshot is not None:
+        catalog_snapshot.invalidate()
+
+_QUESTIONS_PATH = re.compile(r"^/quiz-collections/(\d+)/questions$")
+
+class _Route(NamedTuple):
+    # Stands in for the matched route so MetricsMiddleware labels the request the same way
+    path: str
+
+def _snapshot_key(path: str, query_string: bytes) -> Optional[Tuple[str, str]]:
+    if path == "/categories":
+        return ("categories", path) if not query_string else None
+    if path == "/quiz-collections":
+        params = parse_qsl(query_string.decode("latin-1"))
+        # Only the default, unpaged listing is in the snapshot
+        if len(params) == 1 and params[0][0] == "category" and params[0][1].isdigit():
+            return f"collections/{int(params[0][1])}", path
+        return None
+    match = _QUESTIONS_PATH.match(path)
+    if match and not query_string:
+        return f"questions/{int(match.group(1))}", "/quiz-collections/{collection_id}/questions"
+    return None
+
+class SnapshotMiddleware:
+    """Answers catalog GETs from the shared snapshot when it is current."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if catalog_snapshot is not None and scope["type"] == "http" and scope["method"] == "GET":
+            found = _snapshot_key(scope["path"], scope["query_string"])
+            hit = catalog_snapshot.lookup(found[0]) if found else None
+            if hit is not None:
+                body, entry = hit
+                scope["route"] = _Route(found[1])
+                headers = [(b"etag", entry.etag.encode()), (b"last-modified", entry.last_modified.encode())]
+                request_headers = dict(scope["headers"])
+                if _etag_matches(request_headers.get(b"if-none-match", b"").decode("latin-1"), entry.etag):
+                    await send({"type": "http.response.start", "status": 304, "headers": headers})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+                headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                await send({"type": "http.response.start", "status": 200, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,177 @@
+from email.utils import format_datetime
+from fastapi import Request, Response
+from typing import Dict, Hashable, List, Optional, Tuple
+import datetime
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+
+# With several worker processes the counters must be shared, or a write
+# handled by one worker would leave the others' validators (and every cache
+# keyed by them) unchanged. CATALOG_SNAPSHOT_DIR is the directory the workers
+# already share; when it is set the counters live in a memory-mapped file
+# there. Without it they are per process and only valid with one worker.
+SHARED_DIR = os.environ.get("CATALOG_SNAPSHOT_DIR")
+
+class SharedCounters:
+    """A fixed table of (counter, modified) slots in a memory-mapped file.
+
+    Every worker on the host maps the same file. Keys hash into the slots;
+    two keys sharing a slot only cost each other some extra cache misses.
+    """
+
+    SLOTS = 8192
+    # epoch (random), created (unix time)
+    HEADER = struct.Struct("<8sd")
+    SLOT = struct.Struct("<Qd")
+
+    def __init__(self, path: str):
+        import fcntl
+
+        self._fcntl = fcntl
+        size = self.HEADER.size + self.SLOTS * self.SLOT.size
+        # Every live process holds a shared lock on the boot file. One that can
+        # take it exclusively is the first of a new boot: the database may have
+        # changed since the last one (an offline import, a restore), so it
+        # starts a new epoch and zeroes the counters. The others wait for it.
+        self._boot_fd = os.open(path + ".boot", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._boot_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            new_boot = True
+        except BlockingIOError:
+            new_boot = False
+            fcntl.flock(self._boot_fd, fcntl.LOCK_SH)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._mm = mmap.mmap(self._fd, size)
+            epoch, created = self.HEADER.unpack_from(self._mm)
+            if new_boot or epoch == bytes(8):
+                epoch, created = uuid.uuid4().bytes[:8], time.time()
+                self._mm[self.HEADER.size:] = bytes(size - self.HEADER.size)
+                self.HEADER.pack_into(self._mm, 0, epoch, created)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if new_boot:
+            fcntl.flock(self._boot_fd, fcntl.LOCK_SH)
+        self.epoch = epoch.hex()
+        self.created = created
+        self._offsets: Dict[Hashable, int] = {}
+
+    def _offset(self, key: Hashable) -> int:
+        offset = self._offsets.get(key)
+        if offset is None:
+            # hash() is salted per process, so use a stable digest of the key
+            digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).digest()
+            slot = int.from_bytes(digest, "little") % self.SLOTS
+            offset = self._offsets[key] = self.HEADER.size + slot * self.SLOT.size
+        return offset
+
+    def get(self, key: Hashable) -> Tuple[int, float]:
+        return self.SLOT.unpack_from(self._mm, self._offset(key))
+
+    def bump(self, keys: Tuple[Hashable, ...], now: float) -> List[int]:
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            bumped = []
+            for key in keys:
+                offset = self._offset(key)
+                counter, _ = self.SLOT.unpack_from(self._mm, offset)
+                self.SLOT.pack_into(self._mm, offset, counter + 1, now)
+                bumped.append(counter + 1)
+            return bumped
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+class ResourceVersions:
+    """Per-resource write counters used to build ETag / Last-Modified validators.
+
+    Resources are keyed as ("categories",), ("collections", category_id) and
+    ("questions", collection_id). Reading a version is a dict lookup (or a
+    read from the shared mapping), so conditional GETs never have to query
+    the database.
+    """
+
+    def __init__(self, shared: Optional[SharedCounters] = None):
+        self._shared = shared
+        if shared is not None:
+            self._epoch = shared.epoch
+            self._started = _from_timestamp(shared.created)
+        else:
+            # Distinguishes this process's counters from a previous run's
+            self._epoch = uuid.uuid4().hex[:8]
+            self._started = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self._versions: Dict[Hashable, Tuple[int, datetime.datetime]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self) -> bool:
+        return self._shared is not None
+
+    @property
+    def epoch(self) -> str:
+        return self._epoch
+
+    def get(self, key: Hashable) -> Tuple[int, datetime.datetime]:
+        if self._shared is not None:
+            version, modified = self._shared.get(key)
+            return version, _from_timestamp(modified) if version else self._started
+        return self._versions.get(key, (0, self._started))
+
+    def bump(self, *keys: Hashable) -> List[int]:
+        """Advance ``keys``; returns their new versions."""
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        if self._shared is not None:
+            return self._shared.bump(keys, now.timestamp())
+        with self._lock:
+            bumped = []
+            for key in keys:
+                version, _ = self._versions.get(key, (0, self._started))
+                self._versions[key] = (version + 1, now)
+                bumped.append(version + 1)
+            return bumped
+
+    def headers(self, key: Hashable) -> Dict[str, str]:
+        version, modified = self.get(key)
+        return {
+            "ETag": f'"{self._epoch}-{version}"',
+            "Last-Modified": format_datetime(modified, usegmt=True),
+        }
+
+def _from_timestamp(value: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(int(value), datetime.timezone.utc)
+
+def _make_versions() -> ResourceVersions:
+    if not SHARED_DIR:
+        return ResourceVersions()
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    return ResourceVersions(SharedCounters(os.path.join(SHARED_DIR, "versions.bin")))
+
+versions = _make_versions()
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def conditional_get(request: Request, response: Response, key: Hashable) -> Optional[Response]:
+    """Return a 304 if the client's ETag is current, else stamp validators on ``response``.
+
+    The validators are taken before the body is read, so a concurrent write can
+    only make the tag older than the data, never newer.
+    """
+    headers = versions.headers(key)
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
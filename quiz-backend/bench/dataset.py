@@ -0,0 +1,111 @@
+from sqlalchemy import create_engine, insert
+from app import models
+from typing import List, NamedTuple
+import argparse
+import datetime
+import json
+import random
+
+# Synthetic data for benchmarks, written straight into a database with
+# executemany INSERTs (no HTTP round trips), so large scales load in seconds.
+
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+WORDS = (
+    "capital river planet element theorem battle empire ocean molecule equation "
+    "mountain language composer painting orbit protein algorithm dynasty climate volcano"
+).split()
+
+class Scale(NamedTuple):
+    categories: int = 5
+    collections: int = 20  # per category
+    questions: int = 25    # per collection
+    results: int = 20000
+    users: int = 500
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def generate(url: str, scale: Scale, seed: int = 0, batch_size: int = 5000) -> dict:
+    """Create the schema at ``url`` and fill it; returns row counts per table."""
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Category), [
+            {"id": c, "name": f"Category {c}"} for c in range(1, scale.categories + 1)
+        ])
+        now = datetime.datetime.utcnow()
+        collections = []
+        for c in range(1, scale.categories + 1):
+            for _ in range(scale.collections):
+                collections.append({
+                    "id": len(collections) + 1,
+                    "title": _sentence(rng, 3),
+                    "description": _sentence(rng, 8),
+                    "difficulty": rng.choice(DIFFICULTIES),
+                    "category_id": c,
+                    "created_at": now - datetime.timedelta(minutes=len(collections)),
+                })
+        if collections:
+            conn.execute(insert(models.QuizCollection), collections)
+
+        batch: List[dict] = []
+        for collection in collections:
+            for _ in range(scale.questions):
+                options = [_sentence(rng, 2) for _ in range(4)]
+                batch.append({
+                    "question": _sentence(rng, 10) + "?",
+                    "option1": options[0],
+                    "option2": options[1],
+                    "option3": options[2],
+                    "option4": options[3],
+                    "correct_answer": rng.choice(options),
+                    "collection_id": collection["id"],
+                })
+                if len(batch) >= batch_size:
+                    conn.execute(insert(models.Quiz), batch)
+                    batch = []
+        if batch:
+            conn.execute(insert(models.Quiz), batch)
+
+        batch = []
+        for _ in range(scale.results):
+            total = scale.questions or 10
+            batch.append({
+                "username": f"user{rng.randrange(scale.users)}",
+                "score": rng.randint(0, total),
+                "total_questions": total,
+                "timestamp": now - datetime.timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+            })
+            if len(batch) >= batch_size:
+                conn.execute(insert(models.Result), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.Result), batch)
+    engine.dispose()
+    return {
+        "categories": scale.categories,
+        "collections": len(collections),
+        "questions": len(collections) * scale.questions,
+        "results": scale.results,
+        "users": scale.users,
+    }
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = Scale()
+    for field in Scale._fields:
+        parser.add_argument(f"--{field}", type=int, default=getattr(defaults, field))
+
+def scale_from_args(args: argparse.Namespace) -> Scale:
+    return Scale(*(getattr(args, field) for field in Scale._fields))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic quiz database.")
+    parser.add_argument("url", help="SQLAlchemy URL, e.g. sqlite:///bench.db")
+    parser.add_argument("--seed", type=int, default=0)
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(generate(args.url, scale_from_args(args), seed=args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
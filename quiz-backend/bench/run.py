@@ -0,0 +1,325 @@
+from .dataset import Scale, add_scale_arguments, generate, scale_from_args
+from contextvars import ContextVar
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+# In-process load test: builds a synthetic database, imports the app against
+# it and drives every category/quiz/result route through an ASGI client with
+# concurrent workers. Each scenario runs on its own so its numbers are not
+# mixed with other routes; the report is JSON so runs can be diffed.
+#
+#     python -m bench.run --workers 16 --requests 500 --output run.json
+#     python -m bench.run --baseline run.json    # exit 1 on regressions
+
+ENV_FLAGS = ("DB_ASYNC", "FAST_JSON", "RESULTS_WRITE_BEHIND", "CATALOG_CACHE_SIZE", "DB_POOL_SIZE")
+
+# SQL statements issued while serving the current request, counted through an
+# engine event. The list is shared with the threadpool the sync routes run in.
+_queries: ContextVar[Optional[List[int]]] = ContextVar("bench_queries", default=None)
+
+def _count_query(*args) -> None:
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+class Request(NamedTuple):
+    method: str
+    url: str
+    body: Optional[dict] = None
+
+class State:
+    """Ids the scenarios pick from: the generated dataset plus rows they created."""
+
+    def __init__(self, scale: Scale):
+        self.scale = scale
+        self.collections = scale.categories * scale.collections
+        self.questions = self.collections * scale.questions
+        self.created: Dict[str, List[int]] = {"categories": [], "collections": [], "quizzes": []}
+        self.serial = itertools.count()
+
+    def category(self, rng: random.Random) -> int:
+        return rng.randint(1, self.scale.categories)
+
+    def collection(self, rng: random.Random) -> int:
+        return rng.randint(1, self.collections)
+
+    def user(self, rng: random.Random) -> str:
+        return f"user{rng.randrange(self.scale.users)}"
+
+def _question(n: int, collection_id: Optional[int] = None) -> dict:
+    question = {"question": f"Benchmark question {n}?", "options": ["a", "b", "c", "d"], "correct_answer": "a"}
+    if collection_id is not None:
+        question["collection_id"] = collection_id
+    return question
+
+async def _created(client, state: State, kind: str, setup: Request) -> int:
+    # Delete scenarios consume rows made by the matching create scenario and
+    # make one (untimed) when there are none left
+    if state.created[kind]:
+        return state.created[kind].pop()
+    response = await client.request(setup.method, setup.url, json=setup.body)
+    response.raise_for_status()
+    return response.json()["id"]
+
+def _new_category(state: State, rng: random.Random) -> Request:
+    return Request("POST", "/categories", {"name": f"Bench category {next(state.serial)}"})
+
+def _new_collection(state: State, rng: random.Random) -> Request:
+    n = next(state.serial)
+    return Request("POST", "/quiz-collections", {
+        "title": f"Bench collection {n}",
+        "description": "Created by the benchmark",
+        "category_id": state.category(rng),
+        "questions": [_question(i) for i in range(10)],
+    })
+
+def _new_quiz(state: State, rng: random.Random) -> Request:
+    return Request("POST", "/quizzes", _question(next(state.serial), state.collection(rng)))
+
+async def delete_category(client, state, rng):
+    return Request("DELETE", f"/categories/{await _created(client, state, 'categories', _new_category(state, rng))}")
+
+async def delete_collection(client, state, rng):
+    return Request("DELETE", f"/quiz-collections/{await _created(client, state, 'collections', _new_collection(state, rng))}")
+
+async def delete_quiz(client, state, rng):
+    return Request("DELETE", f"/quizzes/{await _created(client, state, 'quizzes', _new_quiz(state, rng))}")
+
+async def patch_questions(client, state, rng):
+    # Rewrites every question of a collection in one batch; the ids are read untimed
+    collection_id = state.collection(rng)
+    response = await client.get(f"/quiz-collections/{collection_id}/questions")
+    response.raise_for_status()
+    n = next(state.serial)
+    return Request("PATCH", f"/quiz-collections/{collection_id}/questions", {
+        "update": [{"id": q["id"], "question": f"Edited question {n}?"} for q in response.json()],
+    })
+
+def _sync(build: Callable[[State, random.Random], Request]):
+    async def scenario(client, state, rng):
+        return build(state, rng)
+    return scenario
+
+# name -> (build request, kind of row the response creates, if any)
+SCENARIOS: Dict[str, Tuple[Callable, Optional[str]]] = {
+    "GET /categories": (_sync(lambda s, r: Request("GET", "/categories")), None),
+    "GET /quiz-collections": (_sync(lambda s, r: Request("GET", f"/quiz-collections?category={s.category(r)}")), None),
+    "GET /quiz-collections?limit": (_sync(lambda s, r: Request(
+        "GET", f"/quiz-collections?category={s.category(r)}&limit=10&sort=-created_at")), None),
+    "GET /quiz-collections/{id}/questions": (_sync(lambda s, r: Request(
+        "GET", f"/quiz-collections/{s.collection(r)}/questions")), None),
+    "GET /quizzes": (_sync(lambda s, r: Request("GET", f"/quizzes?category={s.category(r)}")), None),
+    "GET /quizzes?stream": (_sync(lambda s, r: Request("GET", f"/quizzes?category={s.category(r)}&stream=true")), None),
+    "GET /results": (_sync(lambda s, r: Request("GET", "/results?limit=100")), None),
+    "GET /results/{username}": (_sync(lambda s, r: Request("GET", f"/results/{s.user(r)}")), None),
+    "POST /categories": (_sync(_new_category), "categories"),
+    "POST /quiz-collections": (_sync(_new_collection), "collections"),
+    "POST /quizzes": (_sync(_new_quiz), "quizzes"),
+    "PUT /quizzes/{id}": (_sync(lambda s, r: Request(
+        "PUT", f"/quizzes/{r.randint(1, s.questions)}", {"question": f"Edited question {next(s.serial)}?"})), None),
+    "PATCH /quiz-collections/{id}/questions": (patch_questions, None),
+    "POST /results": (_sync(lambda s, r: Request("POST", "/results", {
+        "username": s.user(r), "score": r.randint(0, 10), "total_questions": 10})), None),
+    "DELETE /quizzes/{id}": (delete_quiz, None),
+    "DELETE /quiz-collections/{id}": (delete_collection, None),
+    "DELETE /categories/{id}": (delete_category, None),
+}
+
+def percentile(ordered: List[float], pct: float) -> float:
+    # Nearest-rank on an already sorted list
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+def summarize(latencies: List[float], queries: List[int], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": {
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "max": ms(ordered[-1]) if ordered else 0.0,
+        },
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+        "queries_max": max(queries, default=0),
+    }
+
+async def run_scenario(client, state: State, name: str, requests: int, workers: int, warmup: int, seed: int) -> dict:
+    build, creates = SCENARIOS[name]
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    remaining = itertools.count()
+
+    async def worker(worker_id: int, total: int, timed: bool) -> None:
+        nonlocal errors
+        rng = random.Random(f"{seed}:{name}:{worker_id}:{timed}")
+        while next(remaining) < total:
+            request = await build(client, state, rng)
+            counter = [0]
+            token = _queries.set(counter)
+            started = time.perf_counter()
+            try:
+                response = await client.request(request.method, request.url, json=request.body)
+            finally:
+                _queries.reset(token)
+            latency = time.perf_counter() - started
+            if response.status_code >= 400:
+                if timed:
+                    errors += 1
+            elif creates is not None:
+                state.created[creates].append(response.json()["id"])
+            if timed:
+                latencies.append(latency)
+                queries.append(counter[0])
+
+    await asyncio.gather(*(worker(i, warmup, False) for i in range(min(workers, max(warmup, 1)))))
+    remaining = itertools.count()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i, requests, True) for i in range(workers)))
+    return summarize(latencies, queries, errors, time.perf_counter() - started)
+
+async def run(scale: Scale, scenarios: List[str], requests: int, workers: int, warmup: int, seed: int) -> Dict[str, dict]:
+    # Imported here: the app binds its engine to DATABASE_URL at import time
+    import httpx
+    from sqlalchemy import event
+    from app import database
+    from app.main import app
+
+    event.listen(database.engine, "before_cursor_execute", _count_query)
+    if database.async_engine is not None:
+        event.listen(database.async_engine.sync_engine, "before_cursor_execute", _count_query)
+
+    state = State(scale)
+    results = {}
+    # ASGITransport does not send lifespan events, so run startup/shutdown here
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in scenarios:
+                results[name] = await run_scenario(client, state, name, requests, workers, warmup, seed)
+                print(f"{name:40s} p50 {results[name]['latency_ms']['p50']:8.2f} ms  "
+                      f"p99 {results[name]['latency_ms']['p99']:8.2f} ms  "
+                      f"{results[name]['throughput_rps']} req/s", file=sys.stderr)
+    finally:
+        await app.router.shutdown()
+        if database.async_engine is not None:
+            # aiosqlite connections hold threads that would keep the process alive
+            await database.async_engine.dispose()
+    return results
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[dict]:
+    """Scenarios whose p95 latency grew by more than ``tolerance`` or that issue more queries."""
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if now["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append({
+                "scenario": name, "metric": "p95_ms",
+                "baseline": before["latency_ms"]["p95"], "current": now["latency_ms"]["p95"],
+            })
+        if now["queries_per_request"] > before["queries_per_request"]:
+            regressions.append({
+                "scenario": name, "metric": "queries_per_request",
+                "baseline": before["queries_per_request"], "current": now["queries_per_request"],
+            })
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API in-process against a synthetic database.")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", default="", help="regex selecting scenario names")
+    parser.add_argument("--database-url", help="use an existing database instead of generating one")
+    parser.add_argument("--keep", action="store_true", help="keep the generated database")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="report to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95 growth")
+    parser.add_argument("--list", action="store_true", help="list scenario names and exit")
+    add_scale_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(SCENARIOS))
+        return
+    scenarios = [name for name in SCENARIOS if re.search(args.scenarios, name)]
+    scale = scale_from_args(args)
+
+    tmpdir = None
+    dataset = None
+    started = time.perf_counter()
+    if args.database_url:
+        url = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="quiz-bench-")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        dataset = generate(url, scale, seed=args.seed)
+    setup_seconds = time.perf_counter() - started
+    os.environ["DATABASE_URL"] = url
+
+    try:
+        results = asyncio.run(run(scale, scenarios, args.requests, args.workers, args.warmup, args.seed))
+    finally:
+        if tmpdir is not None and not args.keep:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "started_at": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database_url": url if args.keep or args.database_url else "temporary",
+            "dataset": dataset,
+            "setup_seconds": round(setup_seconds, 3),
+            "scale": scale._asdict(),
+            "seed": args.seed,
+            "requests": args.requests,
+            "workers": args.workers,
+            "warmup": args.warmup,
+            "env": {name: os.environ.get(name) for name in ENV_FLAGS},
+        },
+        "scenarios": results,
+    }
+    regressions = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = report["regressions"] = compare(json.load(f), report, args.tolerance)
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+    if regressions:
+        for regression in regressions:
+            print(f"REGRESSION {regression['scenario']}: {regression['metric']} "
+                  f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
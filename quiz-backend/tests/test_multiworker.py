@@ -0,0 +1,145 @@
+"""Two workers sharing one CATALOG_SNAPSHOT_DIR must see each other's writes.
+
+Each worker is a separate uvicorn process, since the shared state (versions,
+snapshot generation, boot lock) is set up per process at import time.
+"""
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTIONS = [{"question": f"q{i}", "options": ["a", "b", "c", "d"], "correct_answer": "a"} for i in range(3)]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class Worker:
+    def __init__(self, tmp_path):
+        self.port = _free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{tmp_path}/quiz.db",
+            CATALOG_SNAPSHOT_DIR=str(tmp_path / "shared"),
+            CATALOG_SNAPSHOT_DELAY="0.05",
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        self.client = httpx.Client(base_url=f"http://127.0.0.1:{self.port}", timeout=10)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                self.client.get("/db/pool")
+                return
+            except httpx.TransportError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("worker did not start")
+                time.sleep(0.1)
+
+    def stop(self):
+        self.client.close()
+        self.process.terminate()
+        self.process.wait(timeout=15)
+
+    def snapshot_hit(self, path: str, headers=None) -> httpx.Response:
+        """GET ``path`` once this worker answers it from a current snapshot."""
+        deadline = time.monotonic() + 10
+        while True:
+            before = self.client.get("/cache/stats").json()["snapshot"]["hits"]
+            response = self.client.get(path, headers=headers)
+            if self.client.get("/cache/stats").json()["snapshot"]["hits"] > before:
+                return response
+            assert time.monotonic() < deadline, "snapshot was never rebuilt"
+            time.sleep(0.05)
+
+@pytest.fixture
+def workers(tmp_path):
+    started = []
+    try:
+        # One after the other, so only one of them creates the schema
+        started.append(Worker(tmp_path))
+        started.append(Worker(tmp_path))
+        yield started
+    finally:
+        for worker in started:
+            worker.stop()
+
+def _catalog(client: httpx.Client):
+    category = client.post("/categories", json={"name": "Science"}).json()
+    collection = client.post("/quiz-collections", json={
+        "title": "Physics", "description": "d", "category_id": category["id"], "questions": QUESTIONS,
+    }).json()
+    return category, collection
+
+def test_catalog_write_reaches_other_worker(workers):
+    a, b = workers
+    category, collection = _catalog(a.client)
+    listing = f"/quiz-collections?category={category['id']}"
+    # Prime B's catalog cache and snapshot before the write
+    assert b.client.get(f"/quizzes?category={category['id']}").status_code == 200
+    before = b.snapshot_hit(listing)
+    assert before.json()[0]["question_count"] == 3
+
+    a.client.post("/quizzes", json={
+        "question": "q3", "options": ["a", "b", "c", "d"], "correct_answer": "a", "collection_id": collection["id"],
+    })
+
+    # Catalog cache (not in the snapshot)
+    assert len(b.client.get(f"/quizzes?category={category['id']}").json()) == 4
+    assert b.client.get(f"{listing}&limit=50").json()[0]["question_count"] == 4
+    # Snapshot: stale at once, then rebuilt
+    assert b.client.get(listing).json()[0]["question_count"] == 4
+    after = b.snapshot_hit(listing)
+    assert after.json()[0]["question_count"] == 4
+    assert len(b.snapshot_hit(f"/quiz-collections/{collection['id']}/questions").json()) == 4
+    assert after.headers["etag"] != before.headers["etag"]
+
+def test_leaderboard_reloads_after_other_worker_records(workers):
+    a, b = workers
+    assert a.client.get("/leaderboard").json()["entries"] == []
+    b.client.post("/results", json={"username": "bob", "score": 5, "total_questions": 5})
+    assert [e["username"] for e in a.client.get("/leaderboard").json()["entries"]] == ["bob"]
+    a.client.post("/results", json={"username": "al", "score": 1, "total_questions": 5})
+    for worker in workers:
+        assert [e["username"] for e in worker.client.get("/leaderboard").json()["entries"]] == ["bob", "al"]
+
+def test_snapshot_and_route_share_etags(workers):
+    a, b = workers
+    _catalog(a.client)
+    # The snapshot only answers the bare path, so the query string sends this to the route
+    from_route = b.client.get("/categories?source=route")
+    etag = from_route.headers["etag"]
+    hit = a.snapshot_hit("/categories", headers={"If-None-Match": etag})
+    assert hit.status_code == 304
+    assert hit.headers["etag"] == etag
+    assert hit.headers["last-modified"] == from_route.headers["last-modified"]
+
+def test_restart_discards_snapshot_from_previous_boot(tmp_path):
+    worker = Worker(tmp_path)
+    try:
+        _catalog(worker.client)
+        stale = worker.snapshot_hit("/categories")
+    finally:
+        worker.stop()
+    # Changed while no worker is running, e.g. by an offline import
+    with sqlite3.connect(tmp_path / "quiz.db") as conn:
+        conn.execute("INSERT INTO categories (name) VALUES ('History')")
+
+    worker = Worker(tmp_path)
+    try:
+        response = worker.client.get("/categories", headers={"If-None-Match": stale.headers["etag"]})
+        assert response.status_code == 200
+        assert [c["name"] for c in response.json()] == ["Science", "History"]
+        assert [c["name"] for c in worker.snapshot_hit("/categories").json()] == ["Science", "History"]
+    finally:
+        worker.stop()